@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import threading
+
+CHECKPOINT_DIR = 'pipeline_checkpoints'
+
+# Checkpoint files are updated from the stage runner threads.
+_checkpoint_lock = threading.Lock()
+
+def file_checksum(path, chunk_size=1 << 20):
+    """
+    Args:
+    path (str): the file to hash.
+    chunk_size (int): number of bytes read at a time.
+
+    Returns:
+    The sha256 hex digest of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def input_signature(paths, extra=None):
+    """
+    Args:
+    paths (list): the input files of a unit of work. Missing files are part of the signature too.
+    extra: any other value the output depends on, e.g. the run options (must be JSON serialisable).
+
+    Returns:
+    A short string that changes when an input file is added, removed, resized or modified.
+    The file sizes and modification times are used, so large inputs don't have to be read.
+    """
+    state = []
+    for path in sorted(paths):
+        try:
+            stat = os.stat(path)
+            state.append([path, stat.st_size, stat.st_mtime_ns])
+        except FileNotFoundError:
+            state.append([path, None, None])
+    return hashlib.sha256(json.dumps([state, extra], default=str).encode()).hexdigest()[:16]
+
+def _checkpoint_path(task, checkpoint_dir):
+    return os.path.join(checkpoint_dir, f'{task}.json')
+
+def load_checkpoints(task, checkpoint_dir=CHECKPOINT_DIR):
+    """
+    Args:
+    task (str): the name of the task, e.g. 'staging'.
+    checkpoint_dir (str): the folder of the checkpoint files.
+
+    Returns:
+    A dictionary with the completed units of the task as keys, and their input signature and output checksums as values.
+    """
+    path = _checkpoint_path(task, checkpoint_dir)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def unit_key(unit):
+    """
+    Args:
+    unit: a unit of work, e.g. a region name or a (dataset type, region) tuple.
+
+    Returns:
+    The unit as a string, used as the key in the checkpoint files.
+    """
+    if isinstance(unit, (tuple, list)):
+        return '/'.join(str(u) for u in unit)
+    return str(unit)
+
+def unit_is_complete(checkpoints, unit, signature):
+    """
+    Args:
+    checkpoints (dict): the checkpoints of the task, from load_checkpoints.
+    unit: the unit of work.
+    signature (str): the current input signature of the unit, from input_signature.
+
+    Returns:
+    True if the unit was completed with the same inputs, and all its outputs are still there with the same checksum.
+    """
+    entry = checkpoints.get(unit_key(unit))
+    if entry is None or entry['signature'] != signature:
+        return False
+    for path, checksum in entry['outputs'].items():
+        if not os.path.exists(path) or file_checksum(path) != checksum:
+            return False
+    return True
+
+def pending_units(task, unit_signatures, resume=True, checkpoint_dir=CHECKPOINT_DIR):
+    """
+    Args:
+    task (str): the name of the task.
+    unit_signatures (dict): the units of work as keys, and their current input signature as values.
+    resume (bool): if False, every unit is pending and the checkpoints are ignored.
+    checkpoint_dir (str): the folder of the checkpoint files.
+
+    Returns:
+    The list of units still to run (in the order of unit_signatures), the completed ones are skipped.
+    """
+    if not resume:
+        return list(unit_signatures)
+    checkpoints = load_checkpoints(task, checkpoint_dir)
+    return [unit for unit, signature in unit_signatures.items() if not unit_is_complete(checkpoints, unit, signature)]
+
+def record_unit_complete(task, unit, signature, output_paths, checkpoint_dir=CHECKPOINT_DIR):
+    """
+    Args:
+    task (str): the name of the task.
+    unit: the unit of work that was completed.
+    signature (str): the input signature of the unit.
+    output_paths (list): the files written by the unit, their checksums are stored.
+    checkpoint_dir (str): the folder of the checkpoint files.
+
+    Returns:
+    None. The checkpoint file is rewritten atomically, so a crash cannot leave it half written.
+    """
+    outputs = {path: file_checksum(path) for path in output_paths}
+    with _checkpoint_lock:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        checkpoints = load_checkpoints(task, checkpoint_dir)
+        checkpoints[unit_key(unit)] = {'signature': signature, 'outputs': outputs}
+
+        path = _checkpoint_path(task, checkpoint_dir)
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(checkpoints, f, indent=1)
+        os.replace(f'{path}.tmp', path)
+    return
+
+def clear_checkpoints(task, checkpoint_dir=CHECKPOINT_DIR):
+    """
+    Args:
+    task (str): the name of the task.
+    checkpoint_dir (str): the folder of the checkpoint files.
+
+    Returns:
+    None. All the units of the task will be run again.
+    """
+    path = _checkpoint_path(task, checkpoint_dir)
+    with _checkpoint_lock:
+        if os.path.exists(path):
+            os.remove(path)
+    return
@@ -0,0 +1,116 @@
+import os
+import numpy as np
+import pandas as pd
+
+CRIME_ID_INDEX_DIR = 'crime_id_index'
+
+def hash_crime_ids(crime_ids):
+    """
+    Args:
+    crime_ids (array-like): Crime ID strings.
+
+    Returns:
+    A uint64 array with a 64-bit hash of each Crime ID (8 bytes each, instead of a python string of about 100 bytes).
+    Missing Crime IDs hash to a value too, use pd.isna on the input to find them.
+    """
+    return pd.util.hash_array(np.asarray(crime_ids, dtype='object'), categorize=False)
+
+def empty_crime_id_index():
+    """
+    Returns:
+    An index without any Crime ID, i.e. an empty sorted uint64 array.
+    """
+    return np.array([], dtype='uint64')
+
+def load_crime_id_index(path):
+    """
+    Args:
+    path (str): the .npy file of the index.
+
+    Returns:
+    The sorted uint64 array of Crime ID hashes, empty if the file does not exist.
+    """
+    if not os.path.exists(path):
+        return empty_crime_id_index()
+    return np.load(path)
+
+def save_crime_id_index(path, index):
+    """
+    Args:
+    path (str): the .npy file of the index.
+    index (np.array): sorted uint64 array of Crime ID hashes.
+
+    Returns:
+    None. The folder of the file is created if needed.
+    """
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.save(path, index)
+    return
+
+def merge_crime_id_index(index, hashes):
+    """
+    Args:
+    index (np.array): sorted uint64 array of Crime ID hashes.
+    hashes (np.array): new Crime ID hashes, in any order.
+
+    Returns:
+    The sorted uint64 array holding the hashes of both, each once.
+    """
+    return np.union1d(index, hashes).astype('uint64')
+
+def in_crime_id_index(index, hashes):
+    """
+    Args:
+    index (np.array): sorted uint64 array of Crime ID hashes.
+    hashes (np.array): Crime ID hashes to look up.
+
+    Returns:
+    A boolean array, True where the hash is in the index (binary search, no copy of the index).
+    """
+    if len(index) == 0:
+        return np.zeros(len(hashes), dtype=bool)
+    position = np.minimum(np.searchsorted(index, hashes), len(index) - 1)
+    return index[position] == hashes
+
+def deduplicate_crime_ids(df, seen=()):
+    """
+    Args:
+    df (pd.DataFrame): df with a 'Crime ID' column.
+    seen (tuple): indexes (sorted uint64 arrays) of the Crime IDs already kept elsewhere.
+
+    Returns:
+    The df without the rows whose Crime ID is in one of the seen indexes or earlier in df, and the hashes of the kept Crime IDs.
+    Rows without a Crime ID are all kept, there is nothing to tell them apart.
+    """
+    missing = df['Crime ID'].isna().to_numpy()
+    hashes = hash_crime_ids(df['Crime ID'])
+
+    duplicate = pd.Series(hashes).duplicated().to_numpy()
+    for index in seen:
+        duplicate = duplicate | in_crime_id_index(index, hashes)
+    duplicate = duplicate & ~missing
+
+    keep = ~duplicate
+    return df[keep], hashes[keep & ~missing]
+
+def find_cross_region_duplicates(region_indexes):
+    """
+    Args:
+    region_indexes (dict): region names as keys, and the sorted uint64 array of each region's Crime ID hashes as values.
+
+    Returns:
+    A DataFrame with, for each region, the number of its Crime IDs that are also in another region ('Cross Force Duplicates').
+    """
+    if not region_indexes:
+        return pd.DataFrame(columns=['Region', 'Crime IDs', 'Cross Force Duplicates'])
+
+    all_hashes = np.concatenate(list(region_indexes.values()))
+    unique_hashes, counts = np.unique(all_hashes, return_counts=True)
+    shared = unique_hashes[counts > 1]
+
+    return pd.DataFrame({
+        'Region': list(region_indexes),
+        'Crime IDs': [len(index) for index in region_indexes.values()],
+        'Cross Force Duplicates': [int(in_crime_id_index(shared, index).sum()) for index in region_indexes.values()],
+    })
@@ -0,0 +1,208 @@
+import os
+import numpy as np
+import pandas as pd
+
+TREND_STATE_DIR = 'trend_state'
+
+TREND_KEYS = ['Crime type', 'Location']
+
+def month_index(year, month):
+    """
+    Args:
+    year (array-like): years, e.g. the 'Date year' column.
+    month (array-like): months 1-12, e.g. the 'Date month' column.
+
+    Returns:
+    The number of months since year 0, so consecutive months are consecutive integers.
+    """
+    return np.asarray(year, dtype='int64') * 12 + np.asarray(month, dtype='int64') - 1
+
+def month_label(index):
+    """
+    Args:
+    index (array-like): month indexes from month_index.
+
+    Returns:
+    The months as 'YYYY-MM' strings.
+    """
+    index = np.asarray(index, dtype='int64')
+    return [f'{y:04d}-{m:02d}' for y, m in zip(index // 12, index % 12 + 1)]
+
+def count_crimes_by_month(df, months=None):
+    """
+    Args:
+    df (pd.DataFrame): primary street df with 'Date year', 'Date month', 'Crime type' and 'Location' columns.
+    months (list): month indexes to count, all the months of df when None.
+
+    Returns:
+    A DataFrame with the 'Month Index', 'Crime type', 'Location' and 'Crime Count' of the requested months.
+    """
+    df_month_index = month_index(df['Date year'], df['Date month'])
+    if months is not None:
+        selected = np.isin(df_month_index, list(months))
+        df = df[selected]
+        df_month_index = df_month_index[selected]
+
+    counts = df[TREND_KEYS].assign(**{'Month Index': df_month_index})
+    counts = counts.groupby(['Month Index'] + TREND_KEYS).size().reset_index(name='Crime Count')
+    return counts
+
+def count_rows_by_month(df):
+    """
+    Args:
+    df (pd.DataFrame): primary street df with 'Date year' and 'Date month' columns.
+
+    Returns:
+    A Series of the number of rows of each month, indexed by month index (from month_index).
+    """
+    df_month_index = month_index(df['Date year'], df['Date month'])
+    if len(df_month_index) == 0:
+        return pd.Series(dtype='int64', index=pd.Index([], dtype='int64', name='Month Index'), name='Rows')
+    first_month = df_month_index.min()
+    rows = np.bincount(df_month_index - first_month)
+    months = np.flatnonzero(rows)
+    return pd.Series(rows[months], index=pd.Index(months + first_month, name='Month Index'), name='Rows')
+
+def changed_months(month_rows, stored_month_rows):
+    """
+    Args:
+    month_rows (pd.Series): rows per month of the current data, from count_rows_by_month.
+    stored_month_rows (pd.Series): rows per month when the counts were stored.
+
+    Returns:
+    The sorted month indexes that are new, restated (a different number of rows) or no longer in the data.
+    """
+    months = month_rows.index.union(stored_month_rows.index)
+    current = month_rows.reindex(months, fill_value=0).to_numpy()
+    stored = stored_month_rows.reindex(months, fill_value=0).to_numpy()
+    return np.asarray(months[current != stored], dtype='int64')
+
+def update_monthly_crime_counts(state_df, new_counts_df, months=None):
+    """
+    Args:
+    state_df (pd.DataFrame): the stored monthly counts, from count_crimes_by_month.
+    new_counts_df (pd.DataFrame): counts for new (or restated) months.
+    months (list): the month indexes replaced, the months of new_counts_df when None. A month without new counts
+    is removed from the state.
+
+    Returns:
+    The state with the months replaced by the new counts.
+    """
+    if months is None:
+        months = new_counts_df['Month Index'].unique()
+    state_df = state_df[~state_df['Month Index'].isin(months)]
+    return pd.concat([state_df, new_counts_df], ignore_index=True).sort_values(['Month Index'] + TREND_KEYS,
+                                                                                ignore_index=True)
+
+def compute_crime_trends(state_df, months, change_threshold=0.1):
+    """
+    Args:
+    state_df (pd.DataFrame): the stored monthly counts.
+    months (list): month indexes to compute the trends for, only the 13 months up to each of them are used.
+    change_threshold (float): relative change of the 3 month average against the 12 month average flagged as a trend.
+
+    Returns:
+    A DataFrame with one row per month, crime type and location that had crimes in the last 12 months:
+    'Month', 'Crime type', 'Location', 'Crime Count', 'Rolling 3 Month', 'Rolling 12 Month',
+    'Same Month Last Year', 'YoY Change', 'YoY Change %' and 'Trend' ('Rising', 'Falling' or 'Stable').
+    """
+    trend_dfs = []
+    for month in np.unique(months):
+        window_df = state_df[state_df['Month Index'].between(month - 12, month)]
+        if window_df.empty:
+            continue
+        # one column per month offset: 0 is the month itself, 12 is the same month last year
+        window_pivot = window_df.pivot_table(index=TREND_KEYS, columns='Month Index', values='Crime Count',
+                                             aggfunc='sum', fill_value=0)
+        window = window_pivot.reindex(columns=range(month, month - 13, -1), fill_value=0).to_numpy()
+
+        rolling_3 = window[:, 0:3].sum(axis=1)
+        rolling_12 = window[:, 0:12].sum(axis=1)
+        last_year = window[:, 12]
+        keep = rolling_12 > 0
+
+        trend_df = window_pivot.index.to_frame(index=False)
+        trend_df.insert(0, 'Month', month_label([month])[0])
+        trend_df['Crime Count'] = window[:, 0]
+        trend_df['Rolling 3 Month'] = rolling_3
+        trend_df['Rolling 12 Month'] = rolling_12
+        trend_df['Same Month Last Year'] = last_year
+        trend_df['YoY Change'] = window[:, 0] - last_year
+        with np.errstate(divide='ignore', invalid='ignore'):
+            trend_df['YoY Change %'] = np.where(last_year > 0, 100 * (window[:, 0] - last_year) / last_year, np.nan)
+            ratio = (rolling_3 / 3) / (rolling_12 / 12)
+        trend_df['Trend'] = np.select([ratio > 1 + change_threshold, ratio < 1 - change_threshold],
+                                      ['Rising', 'Falling'], 'Stable')
+        trend_dfs.append(trend_df[keep])
+
+    if not trend_dfs:
+        return pd.DataFrame(columns=['Month'] + TREND_KEYS + ['Crime Count', 'Rolling 3 Month', 'Rolling 12 Month',
+                                                              'Same Month Last Year', 'YoY Change', 'YoY Change %',
+                                                              'Trend'])
+    return pd.concat(trend_dfs, ignore_index=True)
+
+def region_trends_exist(region, state_dir=TREND_STATE_DIR, report_dir='reporting_dataframe'):
+    """
+    Args:
+    region (str): the region name, e.g. 'metropolitan'.
+    state_dir (str): folder holding the stored monthly counts of each region.
+    report_dir (str): folder of the 'reporting_{region}_crime_trend_df' report.
+
+    Returns:
+    True if the stored monthly counts and the trend report of the region exist.
+    """
+    return (os.path.exists(os.path.join(state_dir, f'monthly_counts_{region}')) and
+            os.path.exists(os.path.join(report_dir, f'reporting_{region}_crime_trend_df')))
+
+def update_region_crime_trends(region, df, state_dir=TREND_STATE_DIR, report_dir='reporting_dataframe'):
+    """
+    Args:
+    region (str): the region name, e.g. 'metropolitan'.
+    df (pd.DataFrame): the primary street df of the region.
+    state_dir (str): folder holding the stored monthly counts of each region.
+    report_dir (str): folder the 'reporting_{region}_crime_trend_df' report is written to.
+
+    Returns:
+    The list of months (as 'YYYY-MM') whose trends were computed.
+    The number of rows of each month is stored with the counts ('month_rows_{region}'), only the months that are
+    new, or whose number of rows changed since (e.g. restated raw data), are counted. The trends are then updated
+    for those months and the 12 following ones already stored, the rest of the report is kept as it is.
+    """
+    os.makedirs(state_dir, exist_ok=True)
+    state_path = os.path.join(state_dir, f'monthly_counts_{region}')
+    rows_path = os.path.join(state_dir, f'month_rows_{region}')
+    report_path = os.path.join(report_dir, f'reporting_{region}_crime_trend_df')
+
+    month_rows = count_rows_by_month(df)
+    if os.path.exists(state_path) and os.path.exists(report_path):
+        state_df = pd.read_csv(state_path, index_col=0)
+        trend_df = pd.read_csv(report_path, index_col=0)
+    else:
+        state_df = count_crimes_by_month(df.iloc[:0])
+        trend_df = compute_crime_trends(state_df, [])
+    if os.path.exists(rows_path) and os.path.exists(state_path) and os.path.exists(report_path):
+        stored_month_rows = pd.read_csv(rows_path, index_col=0)['Rows']
+    else:
+        # without the stored rows, every month is counted again
+        stored_month_rows = pd.Series(-1, index=pd.Index(state_df['Month Index'].unique(), name='Month Index'))
+
+    changed = changed_months(month_rows, stored_month_rows)
+    if len(changed) == 0:
+        return []
+
+    state_df = update_monthly_crime_counts(state_df, count_crimes_by_month(df, changed), changed)
+
+    # a changed month changes its own trends and the windows of the 12 months after it
+    stored_months = state_df['Month Index'].unique()
+    affected = np.unique([m for m in stored_months if ((m - changed >= 0) & (m - changed <= 12)).any()])
+    affected_labels = month_label(affected)
+
+    replaced = trend_df['Month'].isin(affected_labels + month_label(changed))
+    trend_df = pd.concat([trend_df[~replaced], compute_crime_trends(state_df, affected)],
+                         ignore_index=True).sort_values(['Month'] + TREND_KEYS, ignore_index=True)
+
+    state_df.to_csv(state_path)
+    trend_df.to_csv(report_path)
+    month_rows.to_csv(rows_path)
+
+    return affected_labels
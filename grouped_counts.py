@@ -0,0 +1,154 @@
+import numpy as np
+import pandas as pd
+
+ENGINES = ['pandas', 'numpy']
+
+# The counts are kept in a dense bincount array when the number of possible key combinations is at most
+# DENSE_FACTOR times the number of rows (or DENSE_MIN), otherwise the present combinations are found by sorting.
+DENSE_FACTOR = 4
+DENSE_MIN = 1 << 16
+
+def combine_codes(codes, shape):
+    """
+    Args:
+    codes (list): one integer code array per key column, -1 for a missing key.
+    shape (tuple): the number of distinct values of each key column.
+
+    Returns:
+    The int64 combined code of each row (row-major, so sorting the combined codes sorts by the first key, then the
+    second, ...) and a boolean array, False for the rows with a missing key.
+    """
+    combined = np.zeros(len(codes[0]), dtype='int64')
+    valid = np.ones(len(codes[0]), dtype=bool)
+    for key_codes, size in zip(codes, shape):
+        combined = combined * size + key_codes
+        valid &= key_codes >= 0
+    return combined, valid
+
+def grouped_counts(codes, shape, counted=None):
+    """
+    Args:
+    codes (list): one integer code array per key column, -1 for a missing key (those rows are not grouped).
+    shape (tuple): the number of distinct values of each key column.
+    counted (np.array): optional boolean array, the rows to count in the second count, e.g. the non missing values.
+
+    Returns:
+    The combined codes of the groups (sorted), the number of rows in each group, and the number of counted rows in
+    each group (None if counted is None). Use np.unravel_index(groups, shape) to get the code of each key back.
+    """
+    combined, valid = combine_codes(codes, shape)
+    combined = combined[valid]
+    size = int(np.prod(shape, dtype='int64'))
+
+    if size <= max(DENSE_FACTOR * len(combined), DENSE_MIN):
+        sizes = np.bincount(combined, minlength=size)
+        groups = np.flatnonzero(sizes)
+        counts = None
+        if counted is not None:
+            counts = np.bincount(combined[counted[valid]], minlength=size)[groups]
+        return groups, sizes[groups], counts
+
+    groups, inverse, sizes = np.unique(combined, return_inverse=True, return_counts=True)
+    counts = None
+    if counted is not None:
+        counts = np.bincount(inverse[counted[valid]], minlength=len(groups))
+    return groups, sizes, counts
+
+class EncodedRegion:
+    """
+    The integer codes of the key columns of a region df. Each column is encoded once, with its distinct values
+    sorted (the order of groupby), and the codes are shared by all the reports of the region.
+    """
+    def __init__(self, df):
+        self.df = df
+        self._keys = {}
+        self._notna = {}
+
+    def codes(self, column):
+        """
+        Returns:
+        The int64 code of each row (-1 where the value is missing) and the sorted distinct values of the column.
+        """
+        if column not in self._keys:
+            codes, uniques = pd.factorize(self.df[column], sort=True)
+            self._keys[column] = (codes.astype('int64'), uniques)
+        return self._keys[column]
+
+    def set_key(self, name, values, valid=None):
+        """
+        Encodes a derived key, e.g. the map tile of each row.
+
+        Args:
+        name (str): the name of the key.
+        values (array-like): the key of the valid rows.
+        valid (np.array): boolean array of the rows that have a key, all when None.
+        """
+        key_codes, uniques = pd.factorize(values, sort=True)
+        if valid is not None:
+            codes = np.full(len(valid), -1, dtype='int64')
+            codes[valid] = key_codes
+            key_codes = codes
+        self._keys[name] = (key_codes.astype('int64'), uniques)
+        return
+
+    def notna(self, column):
+        """
+        Returns:
+        A boolean array, True where the column is not missing.
+        """
+        if column not in self._notna:
+            self._notna[column] = self.df[column].notna().to_numpy()
+        return self._notna[column]
+
+def encoded_region(df):
+    """
+    Args:
+    df: a region df, or an EncodedRegion.
+
+    Returns:
+    The EncodedRegion of the df, so reports given an EncodedRegion reuse its codes.
+    """
+    return df if isinstance(df, EncodedRegion) else EncodedRegion(df)
+
+def value_counts(region, column):
+    """
+    Args:
+    region (EncodedRegion): the encoded region.
+    column (str): a key column.
+
+    Returns:
+    The same Series as df[column].value_counts(): the number of rows of each value, the most frequent first.
+    """
+    codes, uniques = region.codes(column)
+    sizes = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    present = np.flatnonzero(sizes)
+    # value_counts lists the values in order of appearance before sorting, ties keep that order
+    first_row = np.full(len(uniques), len(codes), dtype='int64')
+    np.minimum.at(first_row, codes[codes >= 0], np.flatnonzero(codes >= 0))
+    present = present[np.argsort(first_row[present], kind='stable')]
+    counts = pd.Series(sizes[present], index=pd.Index(uniques[present], name=column), name='count')
+    return counts.sort_values(ascending=False)
+
+def grouped_count_df(region, columns, count_column=None, name='size'):
+    """
+    Args:
+    region (EncodedRegion): the encoded region.
+    columns (list): the key columns.
+    count_column (str): if given, the non missing values of this column are counted, as in
+    df.groupby(columns)[count_column].count(), otherwise the rows are counted as in df.groupby(columns).size().
+    name (str): the name of the count column.
+
+    Returns:
+    A DataFrame with the key columns and the count column, one row per group in the sorted order of groupby.
+    Rows with a missing key are not grouped, as with groupby.
+    """
+    codes, uniques = zip(*(region.codes(c) for c in columns))
+    shape = tuple(len(u) for u in uniques)
+    counted = region.notna(count_column) if count_column is not None else None
+
+    groups, sizes, counts = grouped_counts(list(codes), shape, counted)
+    key_codes = np.unravel_index(groups, shape) if len(groups) else [np.array([], dtype='int64')] * len(columns)
+
+    count_df = pd.DataFrame({c: u.take(k) for c, u, k in zip(columns, uniques, key_codes)})
+    count_df[name] = (sizes if counts is None else counts).astype('int64')
+    return count_df
@@ -1,120 +1,347 @@
 import logging
 import os
+import grouped_counts
 from street_cleaning import *
 from street_EDA import *
 from postcode_and_price_cleaning import *
+from stage_runner import run_streaming_stage
+from crime_trends import update_region_crime_trends, region_trends_exist
+from police_datasets import *
+from primary_query import (write_primary_partitions, partitions_with_crimes, update_partitions, PRIMARY_PARTITION_DIR,
+                           MANIFEST_FILE)
+from report_cache import ReportCache, report_parameters
+from checkpoint import *
+from run_pipeline import DEFAULT_CONFIG, region_selected, month_selected, shard_suffix
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # Primary and staging steps
 
-def staging():
+def staging(workers=2, queue_size=4, crime_id_index_path=None, resume=True,
+            regions=None, start_month=None, end_month=None, shard=(0, 1)):
     """
     Ingest the data, apply cleaning, and store to CSV files for primary.
+    The street, stop-and-search and outcomes data are found in a single walk of 'police_data',
+    then regions are streamed: reading, cleaning and writing of different regions overlap.
+    Street crimes are deduplicated on a hash of their 'Crime ID' as the files are read, and Crime IDs shared
+    by several forces are reported in 'crime_id_index/cross_force_duplicates'.
+    If crime_id_index_path is given, the Crime IDs staged by earlier runs are read from it and skipped, the new
+    crimes are appended to the staged files, and the index is updated. This is for adding new months incrementally.
+    The new stop-and-search and outcomes rows are appended too, without the rows already in their staged files.
+    Each region dataset is checkpointed in 'pipeline_checkpoints/staging.json' once written. If resume, the regions
+    whose raw files and staged output have not changed since are skipped (not with crime_id_index_path, the staged
+    files are appended to).
+    Only the regions selected by regions and shard (see run_pipeline.region_selected), and the raw files of the months
+    from start_month to end_month are staged. The UK postcode data is cleaned by the first shard only.
     """
     logging.info("Starting staging process...")
 
-    # Ingest raw data
-    street_regional_dic = combined_dataset('street')
-    logging.info("Raw data ingested.")
-
-    # Dropping the 'Context' column for all DataFrames
-    for key, value in street_regional_dic.items():
-        value.drop('Context', axis=1, inplace=True)
-    logging.info("Context column dropped.")
-
-    drop_rows(street_regional_dic, ['Longitude', 
-                                    'Latitude', 
-                                    'Crime ID', 
-                                    'Last outcome category',
-                                    'LSOA code', 'LSOA name'])
-    logging.info("Specified columns dropped.")
-
-    # Dropping duplicates for 'Crime ID' column.
-    for key, value in street_regional_dic.items():
-        value.drop_duplicates(subset='Crime ID', inplace=True)
-    logging.info("Duplicates dropped based on 'Crime ID'.")
-
-    # Making the directory to store the staging data if it doesn't exist
-    try:
-        os.makedirs('staged_dataframe')
-        logging.info("Directory 'staged_dataframe' created.")
-    except FileExistsError:
-        logging.info("Directory 'staged_dataframe' already exists.")
-
-    # Save the staged DataFrame as CSV in staged_dataframe
-    os.chdir('staged_dataframe')
-    for key, value in street_regional_dic.items():
-        value.to_csv(f'staged_{key}')
-    os.chdir('..')
-    logging.info("Staged DataFrames saved to 'staged_dataframe'.")
+    # Making the directories to store the staging data if they don't exist
+    for dataset_type in DATASET_TYPES:
+        try:
+            os.makedirs(layer_dir('staged', dataset_type))
+            logging.info(f"Directory '{layer_dir('staged', dataset_type)}' created.")
+        except FileExistsError:
+            logging.info(f"Directory '{layer_dir('staged', dataset_type)}' already exists.")
+
+    # Index the raw files of each dataset type and region
+    type_region_files = index_police_data_files_by_type(DATASET_TYPES)
+    for dataset_type, region_files in type_region_files.items():
+        # the raw file names start with their month, e.g. '2023-01-kent-street.csv'
+        selected_files = {region: [path for path in paths if month_selected(os.path.basename(path)[:7], start_month, end_month)]
+                          for region, paths in region_files.items() if region_selected(region, regions, shard)}
+        type_region_files[dataset_type] = {region: paths for region, paths in selected_files.items() if paths}
+    for dataset_type, region_files in type_region_files.items():
+        logging.info(f"Found {dataset_type} data for {len(region_files)} regions.")
+
+    keys = [(dataset_type, region) for dataset_type, region_files in type_region_files.items() for region in region_files]
+
+    def staged_path(key):
+        dataset_type, region = key
+        return os.path.join(layer_dir('staged', dataset_type), f'staged_{region}_df')
+
+    # Regions staged by an earlier run with the same raw files and cleaning rules are skipped
+    if resume and crime_id_index_path:
+        logging.info("Resume is not used with a Crime ID index, all regions are staged.")
+        resume = False
+    signatures = {key: input_signature(type_region_files[key[0]][key[1]], extra=STAGING_SCHEMAS[key[0]]) for key in keys}
+    checkpoint_task = f'staging{shard_suffix(shard)}'
+    pending_keys = pending_units(checkpoint_task, signatures, resume)
+    skipped_keys = [key for key in keys if key not in pending_keys]
+    if skipped_keys:
+        logging.info(f"Skipping {len(skipped_keys)} region datasets already staged.")
+
+    # Crime IDs staged by earlier runs
+    if crime_id_index_path:
+        previous_crime_ids = load_crime_id_index(crime_id_index_path)
+        logging.info(f"{len(previous_crime_ids)} Crime IDs loaded from '{crime_id_index_path}'.")
+    else:
+        previous_crime_ids = empty_crime_id_index()
+    region_crime_ids = {}
+    validation_reports = {}
+
+    def read_region(key):
+        # Each monthly file is validated, cleaned and deduplicated as it is read
+        dataset_type, region = key
+        validation_reports[key] = {}
+        # a file that cannot be read fails the region, so it is not checkpointed and the next run reads it again
+        df, crime_ids = read_and_clean_region(dataset_type, type_region_files[dataset_type][region],
+                                              seen_crime_ids=(previous_crime_ids,), report=validation_reports[key],
+                                              skip_unreadable=False)
+        if dataset_type == 'street':
+            region_crime_ids[region] = crime_ids
+        return df
+
+    def write_region(key, df):
+        # Save the staged DataFrame as CSV in the staged layer of its dataset type
+        dataset_type, region = key
+        path = staged_path(key)
+        if crime_id_index_path and os.path.exists(path):
+            if dataset_type != 'street':
+                # the street crimes already staged are skipped by the Crime ID index
+                df = drop_staged_rows(dataset_type, df, path)
+            # the appended rows continue the index of the staged file, primary joins on it in convert_y_m
+            start = len(pd.read_csv(path, usecols=[0]))
+            df.index = pd.RangeIndex(start, start + len(df))
+            df.to_csv(path, mode='a', header=False)
+        else:
+            df.to_csv(path)
+        record_unit_complete(checkpoint_task, key, signatures[key], [path])
+
+    # the regions are cleaned while their files are read, so they go straight from the readers to the writers
+    result = run_streaming_stage(pending_keys, read_region, None, write_region,
+                                 reader_workers=workers, writer_workers=workers, queue_size=queue_size)
+    logging.info(f"Staged {len(result['completed'])} region datasets.")
+    if result['failed']:
+        logging.error(f"Staging failed for: {result['failed']}")
+
+    # Number of rows rejected by each validation rule
+    validation_df = pd.DataFrame([{'Dataset': dataset_type, 'Region': region, 'Rule': rule, 'Rows': n}
+                                  for (dataset_type, region), report in validation_reports.items()
+                                  for rule, n in report.items()],
+                                 columns=['Dataset', 'Region', 'Rule', 'Rows'])
+    validation_path = os.path.join('validation_report', f'staging_validation_report{shard_suffix(shard)}')
+    if os.path.exists(validation_path):
+        # the counts of the regions not staged by this run are kept from the earlier runs
+        previous_df = pd.read_csv(validation_path, index_col=0)
+        staged = previous_df[['Dataset', 'Region']].apply(tuple, axis=1).isin(pending_keys)
+        validation_df = pd.concat([previous_df[~staged], validation_df], ignore_index=True)
+    os.makedirs('validation_report', exist_ok=True)
+    validation_df.to_csv(validation_path)
+    rejected_df = validation_df[validation_df['Rule'] == 'rows rejected']
+    logging.info(f"Validation rejected {rejected_df['Rows'].sum()} rows, see 'validation_report'.")
+
+    # Crime IDs found in more than one force, the skipped regions are read back from their staged files
+    for dataset_type, region in skipped_keys:
+        if dataset_type == 'street':
+            staged_ids = pd.read_csv(staged_path((dataset_type, region)), usecols=['Crime ID'])['Crime ID'].dropna()
+            region_crime_ids[region] = merge_crime_id_index(empty_crime_id_index(), hash_crime_ids(staged_ids))
+    cross_force_df = find_cross_region_duplicates(region_crime_ids)
+    os.makedirs(CRIME_ID_INDEX_DIR, exist_ok=True)
+    cross_force_df.to_csv(os.path.join(CRIME_ID_INDEX_DIR, f'cross_force_duplicates{shard_suffix(shard)}'))
+    logging.info(f"{cross_force_df['Cross Force Duplicates'].sum()} Crime IDs found in more than one force.")
+
+    if crime_id_index_path:
+        # only the crimes of the regions written are added, a region that failed is staged again by the next run
+        staged_crime_ids = np.concatenate([previous_crime_ids] + [region_crime_ids[region] for dataset_type, region
+                                                                 in result['completed'] if dataset_type == 'street'])
+        save_crime_id_index(crime_id_index_path, merge_crime_id_index(empty_crime_id_index(), staged_crime_ids))
+        logging.info(f"Crime ID index saved to '{crime_id_index_path}'.")
 
     # UK postcode
+    if shard[0] != 0:
+        logging.info("UK postcode data is cleaned by the first shard.")
+        return
+    postcode_signature = {'uk_postcode': input_signature([os.path.join('uk_postcode', 'ukpostcodes.csv')])}
     try:
-        uk_post_df = read_and_clean_uk_postcode()
-        logging.info("UK postcode data read and cleaned.")
+        if pending_units(checkpoint_task, postcode_signature, resume):
+            uk_post_df = read_and_clean_uk_postcode()
+            record_unit_complete(checkpoint_task, 'uk_postcode', postcode_signature['uk_postcode'],
+                                 [os.path.join('uk_postcode', 'cleaned_ukpostcodes')] +
+                                 [os.path.join(POSTCODE_STORE_DIR, f'{name}.npy') for name in STORE_ARRAYS])
+            logging.info("UK postcode data read and cleaned.")
+        else:
+            logging.info("UK postcode data already cleaned, skipped.")
     except Exception as e:
         logging.error(f"Failed to read and clean UK postcode data: {e}")
 
     return
 
-def primary():
+def primary(workers=2, queue_size=4, apply_outcomes=True, resume=True, regions=None, shard=(0, 1)):
     """
     Store the transformed data to CSV files.
+    Regions are streamed: reading, transforming and writing of different regions overlap.
+    Outcomes are processed first, so the latest outcome of each street crime can be joined on 'Crime ID' (if apply_outcomes).
+    Each region dataset is checkpointed in 'pipeline_checkpoints/primary.json' once all its outputs (primary file,
+    partitions and postcode merge) are written. If resume, the regions whose staged input has not changed are skipped,
+    so a failed run only redoes the regions that did not finish.
+    When only the outcomes of a skipped street region changed, the outcomes that are new since the last run
+    (see 'outcome_state') are applied without reading and transforming the staged data again: the Crime ID hashes of
+    the partitions find the crimes to update, only the partitions holding them are rewritten, and the primary file
+    and postcode merge of the region are streamed in chunks to update their outcome columns (the postcodes are not
+    merged again). Regions whose crimes have none of the changed outcomes are not read at all.
+    Only the regions selected by regions and shard are processed, the pricing analysis is done by the first shard only.
     """
     logging.info("Starting primary process...")
 
-    # Reading the staged CSV for each location as a dictionary
-    staged_csv_dict = read_pipeline_csv_to_dict('staged')
-    logging.info("Staged CSVs read into dictionary.")
-
-    # Separate yyyy-mm to 2 columns: yyyy and mm
-    for key, value in staged_csv_dict.items():
-        staged_csv_dict[key] = convert_y_m(value)
-    logging.info("Converted yyyy-mm to separate yyyy and mm columns.")
-
-    no_or_near_replace(staged_csv_dict)
-    logging.info("Replaced 'no' or 'near' values.")
-
-    dic_apply_categorization(staged_csv_dict)
-    logging.info("Applied categorization to the DataFrames.")
-
-    # Making the directory to store the primary data if it doesn't exist
-    try:
-        os.makedirs('primary_dataframe')
-        logging.info("Directory 'primary_dataframe' created.")
-    except FileExistsError:
-        logging.info("Directory 'primary_dataframe' already exists.")
-
-    # Save the primary DataFrame as CSV in primary_dataframe
-    os.chdir('primary_dataframe')
-    for key, value in staged_csv_dict.items():
-        value.to_csv(f'primary_{key.split("_")[1]}_df')
-    os.chdir('..')
-    logging.info("Primary DataFrames saved to 'primary_dataframe'.")
-
-    # Postcode analysis, merging the postcode df to the street df
-    try:
-        for key, value in staged_csv_dict.items():
-            merge_coordinate_df(key, value)
-        logging.info("Postcode data merged with street data.")
-    except Exception as e:
-        logging.error(f"Failed to merge postcode data with street data: {e}")
+    # Making the directories to store the primary data if they don't exist
+    for dataset_type in DATASET_TYPES:
+        try:
+            os.makedirs(layer_dir('primary', dataset_type))
+            logging.info(f"Directory '{layer_dir('primary', dataset_type)}' created.")
+        except FileExistsError:
+            logging.info(f"Directory '{layer_dir('primary', dataset_type)}' already exists.")
+
+    def region_of(key):
+        return key[1].split("_")[1]
+
+    def primary_path(key):
+        return os.path.join(layer_dir('primary', key[0]), f'primary_{region_of(key)}_df')
+
+    def unit_inputs(key):
+        dataset_type, file = key
+        inputs = [os.path.join(layer_dir('staged', dataset_type), file)]
+        if dataset_type == 'street':
+            # the postcode merge of the region is redone when the postcode store is rebuilt
+            inputs += [os.path.join(POSTCODE_STORE_DIR, f'{name}.npy') for name in STORE_ARRAYS]
+        return inputs
+
+    # The outcomes applied to a street region are checkpointed on their own, so they can be updated alone
+    def outcomes_unit(key):
+        return ('street-outcomes', key[1])
+
+    def outcomes_signature(key):
+        return input_signature([primary_path(('outcomes', key[1]))])
+
+    def record_outcomes_applied(key, outcome_index):
+        state_path = save_applied_outcomes(region_of(key), outcome_index)
+        record_unit_complete(checkpoint_task, outcomes_unit(key), outcomes_signature(key), [state_path])
+
+    applied_outcomes = {}
+
+    def unit_outputs(key):
+        dataset_type, file = key
+        outputs = [primary_path(key)]
+        if dataset_type == 'street':
+            outputs += [os.path.join(PRIMARY_PARTITION_DIR, region_of(key), MANIFEST_FILE),
+                        os.path.join('post_code_street', f'post_code_{file}')]
+        return outputs
+
+    def read_staged(key):
+        dataset_type, file = key
+        return pd.read_csv(os.path.join(layer_dir('staged', dataset_type), file), index_col=0)
+
+    def transform_staged(key, df):
+        dataset_type, file = key
+        df = transform_primary_dataset(dataset_type, df)
+        if dataset_type == 'street' and apply_outcomes:
+            outcome_index = read_region_outcome_index(file.split("_")[1])
+            applied_outcomes[file] = outcome_index
+            if outcome_index is not None:
+                updated = apply_outcomes_to_street(df, outcome_index)
+                logging.info(f"Outcomes applied to {file}: {updated} crimes updated.")
+        return df
+
+    def write_primary(key, df):
+        # Save the primary DataFrame as CSV in the primary layer of its dataset type
+        dataset_type, file = key
+        df.to_csv(primary_path(key))
+        if dataset_type == 'street':
+            # Partitioned copy by month, read by the primary_query API
+            write_primary_partitions(region_of(key), df)
+            # Postcode analysis, merging the postcode df to the street df.
+            # A failure is reported by the stage runner and the region is not checkpointed, so a rerun retries it.
+            merge_coordinate_df(file, df)
+        record_unit_complete(checkpoint_task, key, input_signature(unit_inputs(key), extra=apply_outcomes), unit_outputs(key))
+        if dataset_type == 'street' and apply_outcomes:
+            record_outcomes_applied(key, applied_outcomes.pop(file))
+
+    def read_outcome_update(key):
+        # Only the outcomes are read here, the street data is updated by write_outcome_update
+        outcome_index = read_region_outcome_index(region_of(key))
+        if outcome_index is None:
+            return outcome_index, outcome_index
+        return changed_outcomes(outcome_index, read_applied_outcomes(region_of(key))), outcome_index
+
+    def write_outcome_update(key, data):
+        changed, outcome_index = data
+        if changed is not None and len(partitions_with_crimes(region_of(key), changed.index)):
+            update_partitions(region_of(key), changed.index, lambda df: apply_outcomes_to_street(df, changed))
+            updated = apply_outcomes_to_file(primary_path(key), changed)
+            apply_outcomes_to_file(os.path.join('post_code_street', f'post_code_{key[1]}'), changed)
+            logging.info(f"{len(changed)} new outcomes for {key[1]}: {updated} crimes updated.")
+            record_unit_complete(checkpoint_task, key, input_signature(unit_inputs(key), extra=apply_outcomes),
+                                 unit_outputs(key))
+        record_outcomes_applied(key, outcome_index)
+
+    checkpoint_task = f'primary{shard_suffix(shard)}'
+
+    # The postcode store is built once here, not by several street regions at the same time
+    if not postcode_store_exists() and os.path.exists(os.path.join('uk_postcode', 'cleaned_ukpostcodes')):
+        build_postcode_store(pd.read_csv(os.path.join('uk_postcode', 'cleaned_ukpostcodes'), index_col=0))
+
+    # The outcomes (and stop and search) go first, the street crimes are joined to the outcomes
+    for dataset_types in [['outcomes', 'stop-and-search'], ['street']]:
+        keys = [(dataset_type, file) for dataset_type in dataset_types
+                for file in sorted(os.listdir(layer_dir('staged', dataset_type)))
+                if region_selected(file.split("_")[1], regions, shard)]
+        signatures = {key: input_signature(unit_inputs(key), extra=apply_outcomes) for key in keys}
+        pending_keys = pending_units(checkpoint_task, signatures, resume)
+        if len(pending_keys) < len(keys):
+            logging.info(f"Skipping {len(keys) - len(pending_keys)} region datasets already in primary.")
+        result = run_streaming_stage(pending_keys, read_staged, transform_staged, write_primary,
+                                     reader_workers=workers, transform_workers=workers,
+                                     writer_workers=workers, queue_size=queue_size)
+        logging.info(f"Primary {', '.join(dataset_types)} DataFrames saved for {len(result['completed'])} region datasets.")
+        if result['failed']:
+            logging.error(f"Primary failed for: {result['failed']}")
+
+    # Street regions already in primary whose outcomes changed
+    if apply_outcomes:
+        outcome_signatures = {outcomes_unit(key): outcomes_signature(key) for key in keys if key not in pending_keys}
+        update_keys = [('street', file) for _, file in pending_units(checkpoint_task, outcome_signatures, resume)]
+        result = run_streaming_stage(update_keys, read_outcome_update, None, write_outcome_update,
+                                     reader_workers=workers, writer_workers=workers, queue_size=queue_size)
+        if update_keys:
+            logging.info(f"Outcomes updated for {len(result['completed'])} street region datasets.")
+        if result['failed']:
+            logging.error(f"Outcome update failed for: {result['failed']}")
 
     # Pricing analysis
+    if shard[0] != 0:
+        logging.info("Pricing analysis is done by the first shard.")
+        return
+    pp_inputs = [os.path.join('properties_sold', f) for f in os.listdir('properties_sold')
+                 if f != 'cleaned_all_year_pp_df'] if os.path.exists('properties_sold') else []
+    pp_signature = {'pricing': input_signature(pp_inputs)}
     try:
-        create_pp_df()
-        logging.info("Pricing analysis completed.")
+        if pending_units(checkpoint_task, pp_signature, resume):
+            create_pp_df()
+            record_unit_complete(checkpoint_task, 'pricing', pp_signature['pricing'],
+                                 [os.path.join('properties_sold', 'cleaned_all_year_pp_df')])
+            logging.info("Pricing analysis completed.")
+        else:
+            logging.info("Pricing analysis already completed, skipped.")
     except Exception as e:
         logging.error(f"Failed to complete pricing analysis: {e}")
 
     return
 
 # Reporting
-def reporting():
+def reporting(cache_bytes=0, resume=True, regions=None, shard=(0, 1), output_format='csv', engine='pandas',
+              report_cache_bytes=0):
     """
     Reporting Layer: Store the aggregated reporting data to CSV files.
+    The primary regions are read one at a time, so only one region (plus the cache_bytes LRU cache) is in memory.
+    Each region is checkpointed in 'pipeline_checkpoints/reporting.json' once its reports are written. If resume,
+    the regions whose primary file and report code (see report_cache.report_parameters) have not changed are skipped,
+    without reading them.
+    Only the regions selected by regions and shard are reported, in the output_format ('csv' or 'parquet').
+    The counts are computed by the engine, 'pandas' or 'numpy' (see grouped_counts), both give the same reports.
+    If report_cache_bytes, the reports are also kept in 'report_cache', keyed on the content of the primary file and
+    the report code. A region whose primary file was already reported gets its reports from the cache, without
+    reading the primary file.
     """
     logging.info("Starting reporting process...")
 
@@ -125,20 +352,70 @@ def reporting():
     except FileExistsError:
         logging.info("Directory 'reporting_dataframe' already exists.")
 
-    primary_dict = read_pipeline_csv_to_dict('primary')
-    logging.info("Primary CSVs read into dictionary.")
-
-    loop_all_functions(primary_dict)
+    primary_layer = read_pipeline_csv_to_dict('primary', lazy=True, cache_bytes=cache_bytes)
+    logging.info(f"Primary layer opened, {len(primary_layer)} regions.")
+
+    # the engines give the same reports, so it is not part of the signatures and the cache key, but the code of
+    # the numpy engine is
+    params = report_parameters(REPORT_FUNCTIONS, modules=[grouped_counts])
+    # the regions are reported again when the report code changes
+    signatures = {key: input_signature([primary_layer.path(key)], extra=[output_format, params]) for key in primary_layer
+                  if region_selected(key.split("_")[1], regions, shard)}
+    checkpoint_task = f'reporting{shard_suffix(shard)}'
+    pending_keys = pending_units(checkpoint_task, signatures, resume)
+    if len(pending_keys) < len(signatures):
+        logging.info(f"Skipping {len(signatures) - len(pending_keys)} regions already reported.")
+
+    report_cache = None
+    if report_cache_bytes:
+        report_cache = ReportCache(max_bytes=report_cache_bytes)
+        report_cache.evict()
+
+    for key in pending_keys:
+        region = key.split("_")[1]
+        reports = None
+        if report_cache is not None:
+            cache_key = report_cache.fingerprint(primary_layer.path(key), params)
+            reports = report_cache.get(cache_key)
+
+        if reports is not None and region_trends_exist(region):
+            # the months of a primary file reported before are already in the trend state
+            write_region_reports(key, reports, output_format, 'reporting_dataframe')
+            logging.info(f"Reports of {key} read from the report cache.")
+        else:
+            primary_df = primary_layer[key]
+            if reports is None:
+                reports = create_region_reports(primary_df, engine)
+                if report_cache is not None:
+                    report_cache.put(cache_key, reports)
+            write_region_reports(key, reports, output_format, 'reporting_dataframe')
+
+            # Rolling crime trends, only the new and restated months are counted
+            updated_months = update_region_crime_trends(region, primary_df)
+            logging.info(f"Reports and crime trends ({len(updated_months)} months updated) done for {key}.")
+            # release the region before the next one is read
+            del primary_df
+
+        report_prefix = f'reporting_{region}_'
+        record_unit_complete(checkpoint_task, key, signatures[key],
+                             [os.path.join('reporting_dataframe', f) for f in sorted(os.listdir('reporting_dataframe'))
+                              if f.startswith(report_prefix)])
     logging.info("Aggregated data processed for reporting.")
 
     return
 
-def main(pipeline_start='staging', pipeline_goal='all'):
+def main(pipeline_start='staging', pipeline_goal='all', resume=True, config=None):
     """
     The function performs the pipeline action for the selected data.
     The order of execution should be 'staging' -> 'primary' -> 'reporting' -> 'all'.
     The pipeline_goal CANNOT be before pipeline_start, e.g., pipeline_start='reporting', pipeline_goal='primary' is not allowed.
+    If resume, the regions completed by an earlier run (see 'pipeline_checkpoints') are skipped when their inputs and
+    outputs have not changed. With resume=False every region is processed again.
+    The other run options (regions, months, shard, workers, memory limit, output format, engine) are read from config,
+    see run_pipeline.DEFAULT_CONFIG. The options not in config keep their default.
     """
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    region_filter = {'regions': config['regions'], 'shard': (config['shard_index'], config['shard_count'])}
     logging.info('Pipeline Execution Started.')
     logging.info(f'Data Layer Start: {pipeline_start}')
     logging.info(f'Data Layer Goal: {pipeline_goal}')
@@ -153,21 +430,25 @@ def main(pipeline_start='staging', pipeline_goal='all'):
             raise ValueError("pipeline_goal cannot be before pipeline_start.")
 
         if pipeline_start == 'staging':
-            staging()
+            staging(workers=config['workers'], queue_size=config['queue_size'],
+                    crime_id_index_path=config['crime_id_index_path'], resume=resume,
+                    start_month=config['start_month'], end_month=config['end_month'], **region_filter)
             logging.info('Staging Completed')
             if pipeline_goal == 'staging':
                 logging.info(f'Target Pipeline: {pipeline_goal} Reached')
                 return
 
         if pipeline_start in ['staging', 'primary']:
-            primary()
+            primary(workers=config['workers'], queue_size=config['queue_size'],
+                    apply_outcomes=config['apply_outcomes'], resume=resume, **region_filter)
             logging.info('Primary Completed')
             if pipeline_goal == 'primary':
                 logging.info(f'Target Pipeline: {pipeline_goal} Reached')
                 return
 
         if pipeline_start in ['staging', 'primary', 'reporting']:
-            reporting()
+            reporting(resume=resume, output_format=config['output_format'], engine=config['engine'],
+                      report_cache_bytes=int(config['report_cache_mb'] * 1024 ** 2), **region_filter)
             logging.info('Reporting Completed')
             if pipeline_goal == 'reporting':
                 logging.info(f'Target Pipeline: {pipeline_goal} Reached')
@@ -181,4 +462,7 @@ def main(pipeline_start='staging', pipeline_goal='all'):
 
     return
 
-main()
+if __name__ == '__main__':
+    # the same options as 'python run_pipeline.py', see run_pipeline.main
+    import run_pipeline
+    run_pipeline.main()
@@ -0,0 +1,325 @@
+import io
+import os
+import numpy as np
+import pandas as pd
+from street_cleaning import *
+from crime_id_index import *
+
+DATASET_TYPES = ['street', 'stop-and-search', 'outcomes']
+
+# The latest outcome of each crime last applied to the primary street data of each region.
+OUTCOME_STATE_DIR = 'outcome_state'
+
+# How each dataset is cleaned in staging:
+# 'drop_columns' are removed, rows failing the validation rules ('required', 'bounding_box' and 'month_column',
+# see validate_rows) are dropped, and duplicates of 'unique' are dropped.
+STAGING_SCHEMAS = {
+    'street': {
+        'drop_columns': ['Context'],
+        'required': ['Longitude', 'Latitude', 'Crime ID', 'Last outcome category', 'LSOA code', 'LSOA name'],
+        'bounding_box': UK_BOUNDING_BOX,
+        'month_column': 'Month',
+        'unique': ['Crime ID'],
+    },
+    'outcomes': {
+        'drop_columns': [],
+        'required': ['Crime ID', 'Month', 'Outcome type'],
+        'bounding_box': UK_BOUNDING_BOX,
+        'month_column': 'Month',
+        'unique': ['Crime ID', 'Month', 'Outcome type'],
+    },
+    'stop-and-search': {
+        'drop_columns': [],
+        'required': ['Date'],
+        'bounding_box': UK_BOUNDING_BOX,
+        'month_column': None,
+        'unique': [],
+    },
+}
+
+def layer_dir(step, dataset_type):
+    """
+    Args:
+    step(str): Stage of the pipeline:'staged', 'primary'.
+    dataset_type (str): the type of data e.g. 'street', 'stop-and-search', 'outcomes'
+
+    Returns:
+    The folder of the layer, e.g. 'staged_dataframe' for street and 'staged_outcomes_dataframe' for outcomes.
+    The street layers keep their original names, so the step name can be passed to read_pipeline_csv_to_dict.
+    """
+    if dataset_type == 'street':
+        return f'{step}_dataframe'
+    return f'{step}_{dataset_type}_dataframe'
+
+def add_validation_counts(report, counts):
+    """
+    Args:
+    report(dict): rule: number of rows, the totals so far.
+    counts(dict): rule: number of rows, e.g. from filter_valid_rows.
+
+    Returns:
+    The report with the counts added.
+    """
+    for rule, n in counts.items():
+        report[rule] = report.get(rule, 0) + n
+    return report
+
+def clean_staged_dataset(dataset_type, df, deduplicate=True, report=None):
+    """
+    Args:
+    dataset_type (str): the type of data e.g. 'street', 'stop-and-search', 'outcomes'
+    df(pd.DataFrame): the combined raw data of one region.
+    deduplicate(bool): whether to drop the duplicates of the 'unique' columns.
+    report(dict): if given, the number of rows rejected by each validation rule is added to it.
+
+    Returns:
+    The df cleaned following STAGING_SCHEMAS.
+    """
+    schema = STAGING_SCHEMAS[dataset_type]
+    df = df.drop(columns=schema['drop_columns'])
+    df, counts = filter_valid_rows(df, schema['required'], schema['bounding_box'], schema['month_column'])
+    if report is not None:
+        add_validation_counts(report, counts)
+    if deduplicate and schema['unique']:
+        df = df.drop_duplicates(subset=schema['unique'])
+    return df
+
+def read_and_clean_region(dataset_type, file_paths, seen_crime_ids=(), report=None, skip_unreadable=True):
+    """
+    Args:
+    dataset_type (str): the type of data e.g. 'street', 'stop-and-search', 'outcomes'
+    file_paths (list): the monthly files of one region.
+    seen_crime_ids (tuple): Crime ID indexes (sorted uint64 hash arrays) of crimes already staged, e.g. by earlier runs.
+    report(dict): if given, the number of rows rejected by each validation rule is added to it.
+    skip_unreadable(bool): if True, a file that cannot be read is printed and skipped, otherwise the error is raised,
+    e.g. so a checkpointed region is not recorded as complete without one of its months.
+
+    Returns:
+    The combined and cleaned df of the region, and the Crime ID index of the rows kept (empty unless deduplicated on 'Crime ID').
+    The files are cleaned one at a time as they are read. When a dataset is unique on 'Crime ID', each file is
+    deduplicated against the hashes of the files read before it, so duplicates are never held in memory.
+    """
+    by_crime_id = STAGING_SCHEMAS[dataset_type]['unique'] == ['Crime ID']
+    region_index = empty_crime_id_index()
+    frames = []
+
+    for path in file_paths:
+        try:
+            df = pd.read_csv(path)
+        except Exception as e:
+            if not skip_unreadable:
+                raise
+            print(f"An error occurred with {path}: {e}")
+            continue
+        df = clean_staged_dataset(dataset_type, df, deduplicate=not by_crime_id, report=report)
+        if by_crime_id:
+            df, hashes = deduplicate_crime_ids(df, seen=tuple(seen_crime_ids) + (region_index,))
+            region_index = merge_crime_id_index(region_index, hashes)
+        frames.append(df)
+
+    if not frames:
+        return pd.DataFrame(), region_index
+
+    df = pd.concat(frames, ignore_index=True)
+    if not by_crime_id and STAGING_SCHEMAS[dataset_type]['unique']:
+        # duplicates across the monthly files
+        df.drop_duplicates(subset=STAGING_SCHEMAS[dataset_type]['unique'], inplace=True)
+    return df, region_index
+
+def drop_staged_rows(dataset_type, df, staged_path):
+    """
+    Args:
+    dataset_type (str): the type of data, 'stop-and-search' or 'outcomes' (street crimes use the Crime ID index).
+    df(pd.DataFrame): the cleaned df of one region, to be appended to its staged file.
+    staged_path (str): the staged file of the region.
+
+    Returns:
+    The rows of df that are not in the staged file yet, with the columns in the order of the staged file.
+    Rows are compared on the 'unique' columns of the dataset (on all the columns when it has none), as they are
+    written in the CSV, so a month staged again is not appended twice.
+    """
+    staged_columns = pd.read_csv(staged_path, index_col=0, nrows=0).columns
+    df = df.reindex(columns=staged_columns)
+    key_columns = STAGING_SCHEMAS[dataset_type]['unique'] or list(staged_columns)
+
+    # the new rows go through the same CSV formatting as the staged ones before hashing
+    new_keys = pd.read_csv(io.StringIO(df[key_columns].to_csv(index=False)), dtype=str, keep_default_na=False)
+    staged_keys = pd.read_csv(staged_path, usecols=key_columns, dtype=str, keep_default_na=False)[key_columns]
+    staged = np.isin(pd.util.hash_pandas_object(new_keys, index=False).to_numpy(),
+                     pd.util.hash_pandas_object(staged_keys, index=False).to_numpy())
+    return df[~staged]
+
+def convert_stop_and_search_date(df):
+    """
+    Args:
+    df(pd.DataFrame): stop and search df with a 'Date' column in ISO 8601 format, e.g. '2023-08-01T10:30:00+01:00'.
+
+    Returns:
+    The df with 'Date' converted to a UTC datetime, and separate 'Date year' and 'Date month' columns.
+    """
+    df['Date'] = pd.to_datetime(df['Date'], format='ISO8601', utc=True)
+    df['Date year'] = df['Date'].dt.strftime('%Y')
+    df['Date month'] = df['Date'].dt.strftime('%m')
+    return df
+
+def apply_outcome_type_categorization(df):
+    """
+    Args:
+    df(pd.DataFrame): outcomes df.
+
+    Returns:
+    Apply categorisation to the 'Outcome type' column.
+    """
+    df['Broad Outcome Category'] = df['Outcome type'].apply(categorize_outcome)
+    return df
+
+def transform_primary_dataset(dataset_type, df):
+    """
+    Args:
+    dataset_type (str): the type of data e.g. 'street', 'stop-and-search', 'outcomes'
+    df(pd.DataFrame): a staged df.
+
+    Returns:
+    The df transformed for the primary layer.
+    """
+    if dataset_type == 'stop-and-search':
+        return convert_stop_and_search_date(df)
+
+    # Separate yyyy-mm to 2 columns: yyyy and mm
+    df = convert_y_m(df)
+    no_or_near_replace({dataset_type: df})
+    if dataset_type == 'outcomes':
+        return apply_outcome_type_categorization(df)
+    return apply_categorization(df)
+
+def latest_outcomes(outcomes_df):
+    """
+    Args:
+    outcomes_df(pd.DataFrame): outcomes df with 'Crime ID', 'Date' (or 'Month') and 'Outcome type' columns.
+
+    Returns:
+    A Series of the most recent 'Outcome type' of each crime, indexed (hash based) by 'Crime ID'.
+    """
+    date_column = 'Date' if 'Date' in outcomes_df.columns else 'Month'
+    latest = outcomes_df.dropna(subset=['Crime ID']).sort_values(date_column, kind='stable')
+    latest = latest.drop_duplicates(subset='Crime ID', keep='last')
+    return pd.Series(latest['Outcome type'].to_numpy(), index=pd.Index(latest['Crime ID'].to_numpy()))
+
+def apply_outcomes_to_street(street_df, outcome_index):
+    """
+    Args:
+    street_df(pd.DataFrame): street df with 'Crime ID' and 'Last outcome category' columns.
+    outcome_index(pd.Series): latest outcome per Crime ID, from latest_outcomes.
+
+    Returns:
+    The number of street crimes whose outcome was changed.
+    The 'Last outcome category' (and 'Broad Outcome Category' if present) of the matching crimes is updated in place,
+    the join is a hash lookup of each Crime ID in the outcome index.
+    """
+    positions = outcome_index.index.get_indexer(street_df['Crime ID'])
+    matched = positions >= 0
+    new_outcome = outcome_index.to_numpy()[positions[matched]]
+
+    changed = street_df.loc[matched, 'Last outcome category'].to_numpy() != new_outcome
+    street_df.loc[matched, 'Last outcome category'] = new_outcome
+    if 'Broad Outcome Category' in street_df.columns:
+        street_df.loc[matched, 'Broad Outcome Category'] = [categorize_outcome(o) for o in new_outcome]
+
+    return int(changed.sum())
+
+def apply_outcomes_to_file(path, outcome_index, chunksize=100000):
+    """
+    Args:
+    path (str): a CSV file of street crimes, e.g. a primary street file, with 'Crime ID' and 'Last outcome category'.
+    outcome_index(pd.Series): outcome per Crime ID to apply, e.g. the changed outcomes from changed_outcomes.
+    chunksize (int): the number of rows held in memory at a time.
+
+    Returns:
+    The number of crimes whose outcome was changed, see apply_outcomes_to_street.
+    The file is streamed in chunks as text into a temporary file, which replaces it when some outcomes changed, so
+    the other values are written back as they were.
+    """
+    updated = 0
+    with open(f'{path}.tmp', 'w', newline='') as f:
+        for i, chunk in enumerate(pd.read_csv(path, index_col=0, dtype=str, keep_default_na=False, chunksize=chunksize)):
+            updated += apply_outcomes_to_street(chunk, outcome_index)
+            chunk.to_csv(f, header=i == 0)
+    if updated:
+        os.replace(f'{path}.tmp', path)
+    else:
+        os.remove(f'{path}.tmp')
+    return updated
+
+def read_region_outcome_index(region, primary_outcomes_dir=layer_dir('primary', 'outcomes')):
+    """
+    Args:
+    region (str): the region name, e.g. 'metropolitan'.
+    primary_outcomes_dir (str): the folder of the primary outcomes layer.
+
+    Returns:
+    The latest outcome per Crime ID of the region (see latest_outcomes), or None if the region has no outcomes.
+    Only the columns needed for the join are read.
+    """
+    path = os.path.join(primary_outcomes_dir, f'primary_{region}_df')
+    if not os.path.exists(path):
+        return None
+    return latest_outcomes(pd.read_csv(path, usecols=['Crime ID', 'Date', 'Outcome type']))
+
+def applied_outcomes_path(region, state_dir=OUTCOME_STATE_DIR):
+    """
+    Args:
+    region (str): the region name, e.g. 'metropolitan'.
+    state_dir (str): the folder of the applied outcomes.
+
+    Returns:
+    The file of the outcomes last applied to the primary street data of the region.
+    """
+    return os.path.join(state_dir, f'applied_outcomes_{region}')
+
+def read_applied_outcomes(region, state_dir=OUTCOME_STATE_DIR):
+    """
+    Args:
+    region (str): the region name.
+    state_dir (str): the folder of the applied outcomes.
+
+    Returns:
+    The latest outcome per Crime ID last applied to the region (see latest_outcomes), empty if none was saved.
+    """
+    path = applied_outcomes_path(region, state_dir)
+    if not os.path.exists(path):
+        return pd.Series([], index=pd.Index([], dtype='object'), dtype='object')
+    applied_df = pd.read_csv(path)
+    return pd.Series(applied_df['Outcome type'].to_numpy(), index=pd.Index(applied_df['Crime ID'].to_numpy()))
+
+def save_applied_outcomes(region, outcome_index, state_dir=OUTCOME_STATE_DIR):
+    """
+    Args:
+    region (str): the region name.
+    outcome_index (pd.Series): the latest outcome per Crime ID applied to the region, None if the region has no outcomes.
+    state_dir (str): the folder of the applied outcomes.
+
+    Returns:
+    The path of the saved file.
+    """
+    if outcome_index is None:
+        outcome_index = read_applied_outcomes(region, state_dir).iloc[:0]
+    os.makedirs(state_dir, exist_ok=True)
+    path = applied_outcomes_path(region, state_dir)
+    pd.DataFrame({'Crime ID': outcome_index.index, 'Outcome type': outcome_index.to_numpy()}).to_csv(path, index=False)
+    return path
+
+def changed_outcomes(outcome_index, applied_index):
+    """
+    Args:
+    outcome_index (pd.Series): the current latest outcome per Crime ID, from latest_outcomes.
+    applied_index (pd.Series): the latest outcome per Crime ID applied before, from read_applied_outcomes.
+
+    Returns:
+    The part of outcome_index that is new or different from applied_index, to apply with apply_outcomes_to_street.
+    """
+    if len(applied_index) == 0:
+        return outcome_index
+    positions = applied_index.index.get_indexer(outcome_index.index)
+    previous = np.where(positions >= 0, applied_index.to_numpy(dtype='object')[positions], None)
+    changed = (positions < 0) | (previous != outcome_index.to_numpy(dtype='object'))
+    return outcome_index[changed]
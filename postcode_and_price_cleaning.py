@@ -1,6 +1,11 @@
 import street_cleaning as cf
 import os
+import threading
 import pandas as pd
+from postcode_store import *
+
+# merge_coordinate_df is called by several writer threads, only the first one builds a missing postcode store.
+_postcode_store_lock = threading.Lock()
 
 def remove_uk_post_duplicate(uk_post_df):
     """
@@ -15,13 +20,17 @@ def read_and_clean_uk_postcode():
     Function reads and cleans the uk postcode data, then store it as a new csv.
     """
     os.chdir('uk_postcode') #entering the directory that saved the ukpostcode data.
-    uk_post_df = pd.read_csv('ukpostcodes.csv')
-    uk_post_df.columns = ['ID', 'Postcode', 'Latitude', 'Longitude']
-    uk_post_df = uk_post_df[['Postcode', 'Latitude', 'Longitude']]
-    uk_post_df.dropna(subset= ['Latitude','Longitude'], inplace=True)
+    try:
+        uk_post_df = pd.read_csv('ukpostcodes.csv')
+        uk_post_df.columns = ['ID', 'Postcode', 'Latitude', 'Longitude']
+        uk_post_df = uk_post_df[['Postcode', 'Latitude', 'Longitude']]
+        uk_post_df.dropna(subset= ['Latitude','Longitude'], inplace=True)
+
+        uk_post_df.to_csv('cleaned_ukpostcodes') #saving the cleaned df as a new csv.
+    finally:
+        os.chdir('..') #return to the main folder.
 
-    uk_post_df.to_csv('cleaned_ukpostcodes') #saving the cleaned df as a new csv.
-    os.chdir('..') #return to the main folder.
+    build_postcode_store(uk_post_df) #memory-mapped copy used for the postcode lookups.
     
     return 
 
@@ -45,26 +54,31 @@ def merge_coordinate_df(street_df_name, street_df):
 
     Returns:
     A merged df. And saved as post_code_street in a new directory.
-    """
-    try:
-        os.makedirs('post_code_street')
-    except:
-        pass
-    os.chdir('uk_postcode') #getting the uk postcode data.
-    uk_post_df = pd.read_csv('cleaned_ukpostcodes',index_col=0)
-    os.chdir('..') #back to the main folder.
-
-    merged_df = pd.merge(rounding_lon_lat_3dp(street_df), 
-                         remove_uk_post_duplicate(rounding_lon_lat_3dp(uk_post_df)), 
-                         how='inner', 
-                         left_on=['Latitude_4dp', 'Longitude_4dp'], 
-                         right_on=['Latitude_4dp', 'Longitude_4dp'])
-    
-    os.chdir('post_code_street')
-    merged_df.to_csv(f'post_code_{street_df_name}')
-    os.chdir('..')
+    The postcodes are read from the memory-mapped postcode store (built from the cleaned csv if it is missing),
+    each crime is matched to the first postcode sharing its 3.d.p coordinates.
+    """
+    os.makedirs('post_code_street', exist_ok=True)
+    # paths are used instead of os.chdir, so regions can be merged from several threads.
+    with _postcode_store_lock:
+        if not postcode_store_exists():
+            build_postcode_store(pd.read_csv(os.path.join('uk_postcode', 'cleaned_ukpostcodes'), index_col=0))
+    store = load_postcode_store()
+
+    street_df = rounding_lon_lat_3dp(street_df)
+    positions = cell_representatives(store, street_df['Latitude'], street_df['Longitude'])
+    matched = positions >= 0
+    positions = positions[matched]
+
+    merged_df = street_df[matched].reset_index(drop=True).rename(columns={'Latitude': 'Latitude_x',
+                                                                        'Longitude': 'Longitude_x'})
+    latitude, longitude = store_coordinates(store, positions)
+    merged_df['Postcode'] = store['postcode'][positions].astype(str)
+    merged_df['Latitude_y'] = latitude
+    merged_df['Longitude_y'] = longitude
+
+    merged_df.to_csv(os.path.join('post_code_street', f'post_code_{street_df_name}'))
 
-    return 
+    return
 
 def read_pp_df(file_name):
     """
@@ -152,33 +166,35 @@ def create_pp_df():
     """
     pp = Postcode Price
     This cod only works until 2024.
+    The output 'cleaned_all_year_pp_df' is skipped when listing the input files, so the function can be run again.
     """
     os.chdir('properties_sold')
-    cleaned_all_year_pp_df = pd.DataFrame()
-
-    file_lst = os.listdir()
-    for f in file_lst:
-        if f == 'pp-monthly-update-new-version':
-            pp = read_pp_df('pp-monthly-update-new-version')
-            pp_to_date_format(pp)
-            pp = pp[pp['Date of Transfer'].dt.year == 2024]
-        else:
-            pp = read_pp_df(f)
-            pp_to_date_format(pp)
-
-        pp = pp_keep_specified_columns(pp)
-        pp = pp.dropna(subset='Postcode')
-        pp_replace_street(pp)
-        pp_property_type_full_name(pp)
-        pp_old_new_full_name(pp)
-        pp_duration_full_name(pp)
-
-        cleaned_all_year_pp_df = pd.concat([cleaned_all_year_pp_df, pp], ignore_index=True)
-
-    
-    cleaned_all_year_pp_df.to_csv('cleaned_all_year_pp_df')
-
-    os.chdir('../')
+    try:
+        cleaned_all_year_pp_df = pd.DataFrame()
+
+        file_lst = [f for f in os.listdir() if f != 'cleaned_all_year_pp_df']
+        for f in file_lst:
+            if f == 'pp-monthly-update-new-version':
+                pp = read_pp_df('pp-monthly-update-new-version')
+                pp_to_date_format(pp)
+                pp = pp[pp['Date of Transfer'].dt.year == 2024]
+            else:
+                pp = read_pp_df(f)
+                pp_to_date_format(pp)
+
+            pp = pp_keep_specified_columns(pp)
+            pp = pp.dropna(subset='Postcode')
+            pp_replace_street(pp)
+            pp_property_type_full_name(pp)
+            pp_old_new_full_name(pp)
+            pp_duration_full_name(pp)
+
+            cleaned_all_year_pp_df = pd.concat([cleaned_all_year_pp_df, pp], ignore_index=True)
+
+        cleaned_all_year_pp_df.to_csv('cleaned_all_year_pp_df')
+    finally:
+        # back to the main folder, even if a file could not be cleaned
+        os.chdir('../')
 
     return
 
@@ -0,0 +1,216 @@
+import numpy as np
+import pandas as pd
+from postcode_store import *
+
+EARTH_RADIUS_M = 6_371_000
+
+# Smallest distance covered by one bucket of the store, north-south (3.d.p of latitude).
+CELL_SIZE_M = np.radians(1 / CELL_SCALE) * EARTH_RADIUS_M
+
+def normalise_postcodes(postcodes):
+    """
+    Args:
+    postcodes (array-like): postcodes in any case and spacing, e.g. 'sw1a1aa', ' SW1A  1AA'.
+
+    Returns:
+    A numpy array of the postcodes in the standard format, upper case with one space before the inward code, e.g. 'SW1A 1AA'.
+    Missing postcodes become ''.
+    """
+    compact = pd.Series(postcodes, dtype='object').fillna('').astype(str).str.upper().str.replace(r'\s+', '', regex=True)
+    formatted = compact.str[:-3] + ' ' + compact.str[-3:]
+    return formatted.where(compact.str.len() > 3, compact).to_numpy(dtype='object')
+
+def postcode_outcode(postcodes):
+    """
+    Args:
+    postcodes (array-like): postcodes in any format.
+
+    Returns:
+    A numpy array of the outward codes, e.g. 'SW1A' for 'SW1A 1AA'.
+    """
+    return pd.Series(normalise_postcodes(postcodes)).str.split(' ').str[0].to_numpy(dtype='object')
+
+def postcode_sector(postcodes):
+    """
+    Args:
+    postcodes (array-like): postcodes in any format.
+
+    Returns:
+    A numpy array of the postcode sectors, e.g. 'SW1A 1' for 'SW1A 1AA'.
+    """
+    return pd.Series(normalise_postcodes(postcodes)).str[:-2].str.strip().to_numpy(dtype='object')
+
+def build_postcode_index(store):
+    """
+    Args:
+    store (dict): a store from load_postcode_store.
+
+    Returns:
+    A Series with the store positions as values, indexed (hash based) by the store postcodes without spaces.
+    If a postcode is in the store more than once, the first one is kept.
+    Build it once and pass it to lookup_postcode_coordinates when doing several batches.
+    """
+    keys = pd.Series(store['postcode'].astype(str)).str.replace(' ', '', regex=False)
+    keys = keys[~keys.duplicated()]
+    return pd.Series(keys.index.to_numpy(), index=pd.Index(keys.to_numpy()))
+
+def lookup_postcode_coordinates(store, postcodes, index=None):
+    """
+    Args:
+    store (dict): a store from load_postcode_store.
+    postcodes (array-like): the postcodes to look up, in any case and spacing.
+    index (pandas.Series): the index from build_postcode_index, built when not given.
+
+    Returns:
+    A DataFrame with one row per query: the normalised 'Postcode', its 'Latitude' and 'Longitude'.
+    Postcodes that are not in the store get NaN coordinates.
+    """
+    if index is None:
+        index = build_postcode_index(store)
+
+    normalised = normalise_postcodes(postcodes)
+    matches = index.index.get_indexer(pd.Series(normalised).str.replace(' ', '', regex=False))
+    found = matches >= 0
+    positions = np.where(found, index.to_numpy()[matches], -1)
+
+    latitude = np.full(len(positions), np.nan)
+    longitude = np.full(len(positions), np.nan)
+    latitude[found], longitude[found] = store_coordinates(store, positions[found])
+
+    return pd.DataFrame({'Postcode': normalised, 'Latitude': latitude, 'Longitude': longitude})
+
+def postcode_prefix_ranges(store, prefixes):
+    """
+    Args:
+    store (dict): a store from load_postcode_store.
+    prefixes (array-like): outward codes (e.g. 'SW1A') or sectors (e.g. 'SW1A 1').
+
+    Returns:
+    Two arrays (start, stop): the store postcodes starting with prefixes[i] are store['postcode'][start[i]:stop[i]].
+    An outward code only matches itself, 'SW1' does not match 'SW1A'.
+    """
+    prefixes = pd.Series(prefixes, dtype='object').fillna('').astype(str).str.upper().str.strip()
+    # an outward code is completed with the space, a sector already contains it
+    prefixes = prefixes.where(prefixes.str.contains(' '), prefixes + ' ').str.replace(r'\s+', ' ', regex=True)
+
+    lower = prefixes.to_numpy().astype('S')
+    # the smallest string greater than every string starting with the prefix
+    upper = prefixes.str[:-1] + prefixes.str[-1].map(lambda c: chr(ord(c) + 1))
+    upper = upper.to_numpy().astype('S')
+
+    postcodes = store['postcode']
+    return np.searchsorted(postcodes, lower, side='left'), np.searchsorted(postcodes, upper, side='left')
+
+def lookup_postcode_prefix(store, prefix):
+    """
+    Args:
+    store (dict): a store from load_postcode_store.
+    prefix (str): an outward code (e.g. 'SW1A') or a sector (e.g. 'SW1A 1').
+
+    Returns:
+    A DataFrame with the 'Postcode', 'Latitude' and 'Longitude' of every postcode in the outward code or sector.
+    """
+    start, stop = postcode_prefix_ranges(store, [prefix])
+    positions = np.arange(start[0], stop[0])
+    latitude, longitude = store_coordinates(store, positions)
+    return pd.DataFrame({'Postcode': store['postcode'][positions].astype(str),
+                         'Latitude': latitude,
+                         'Longitude': longitude})
+
+def _ring_offsets(ring):
+    """
+    Returns:
+    The (latitude, longitude) bucket offsets on the square ring at the given distance from the centre bucket.
+    """
+    if ring == 0:
+        return [(0, 0)]
+    offsets = []
+    for d in range(-ring, ring + 1):
+        offsets += [(-ring, d), (ring, d)]
+    for d in range(-ring + 1, ring):
+        offsets += [(d, -ring), (d, ring)]
+    return offsets
+
+def _nearest_positions_chunk(store, latitude, longitude, max_rings):
+    """
+    Nearest store postcode for one chunk of queries, see nearest_postcodes.
+    """
+    n = len(latitude)
+    best_position = np.full(n, -1, dtype='int64')
+    best_distance = np.full(n, np.inf)
+
+    valid = np.isfinite(latitude) & np.isfinite(longitude)
+    lat_cell = np.rint(np.where(valid, latitude, 0) * CELL_SCALE).astype('int64')
+    lon_cell = np.rint(np.where(valid, longitude, 0) * CELL_SCALE).astype('int64')
+    cos_lat = np.cos(np.radians(np.where(valid, latitude, 0)))
+
+    cell_keys = store['cell_keys']
+    cell_order = store['cell_order']
+    active = np.flatnonzero(valid)
+
+    for ring in range(max_rings + 1):
+        for d_lat, d_lon in _ring_offsets(ring):
+            keys = coordinate_cell_keys((lat_cell[active] + d_lat) / CELL_SCALE,
+                                        (lon_cell[active] + d_lon) / CELL_SCALE)
+            start = np.searchsorted(cell_keys, keys, side='left')
+            counts = np.searchsorted(cell_keys, keys, side='right') - start
+            if counts.sum() == 0:
+                continue
+
+            # one row per (query, candidate postcode) pair
+            query = np.repeat(active, counts)
+            within_cell = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            candidate = np.asarray(cell_order[np.repeat(start, counts) + within_cell], dtype='int64')
+
+            cand_lat, cand_lon = store_coordinates(store, candidate)
+            dy = np.radians(cand_lat - latitude[query])
+            dx = np.radians(cand_lon - longitude[query]) * cos_lat[query]
+            distance = EARTH_RADIUS_M * np.hypot(dx, dy)
+
+            # closest candidate of each query
+            order = np.lexsort((distance, query))
+            first = np.r_[True, query[order][1:] != query[order][:-1]]
+            closest = order[first]
+            better = distance[closest] < best_distance[query[closest]]
+            best_distance[query[closest][better]] = distance[closest][better]
+            best_position[query[closest][better]] = candidate[closest][better]
+
+        # anything outside the searched square is at least `ring` buckets away
+        covered = ring * CELL_SIZE_M * cos_lat[active]
+        active = active[best_distance[active] > covered]
+        if len(active) == 0:
+            break
+
+    return best_position, best_distance
+
+def nearest_postcodes(store, latitude, longitude, max_rings=20, chunk_size=200_000):
+    """
+    Args:
+    store (dict): a store from load_postcode_store.
+    latitude (array-like): latitudes of the queries, e.g. crime points.
+    longitude (array-like): longitudes of the queries.
+    max_rings (int): how many rings of 3.d.p buckets (about 111 m each) to search around each query.
+    chunk_size (int): number of queries processed at once, this bounds the memory used.
+
+    Returns:
+    A DataFrame with one row per query: the nearest 'Postcode', its 'Sector' and the 'Distance (m)' to it.
+    Queries with no postcode within max_rings buckets (or NaN coordinates) get missing values.
+    """
+    latitude = np.asarray(latitude, dtype='float64')
+    longitude = np.asarray(longitude, dtype='float64')
+
+    positions = np.full(len(latitude), -1, dtype='int64')
+    distance = np.full(len(latitude), np.nan)
+    for start in range(0, len(latitude), chunk_size):
+        stop = start + chunk_size
+        positions[start:stop], distance[start:stop] = _nearest_positions_chunk(store, latitude[start:stop],
+                                                                               longitude[start:stop], max_rings)
+
+    found = positions >= 0
+    postcodes = np.full(len(positions), None, dtype='object')
+    postcodes[found] = store['postcode'][positions[found]].astype(str)
+    sectors = np.full(len(positions), None, dtype='object')
+    sectors[found] = postcode_sector(postcodes[found])
+    distance[~found] = np.nan
+
+    return pd.DataFrame({'Postcode': postcodes, 'Sector': sectors, 'Distance (m)': distance})
@@ -0,0 +1,180 @@
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+POSTCODE_STORE_DIR = os.path.join('uk_postcode', 'postcode_store')
+
+# Coordinates are kept as integer micro-degrees, the 6 d.p. of the source data fit exactly in int32.
+COORDINATE_SCALE = 1_000_000
+
+# Size of a spatial bucket in degrees (3.d.p, the same rounding used to match street crimes to postcodes).
+CELL_SCALE = 1_000
+
+STORE_ARRAYS = ['postcode', 'latitude_e6', 'longitude_e6', 'cell_keys', 'cell_order']
+
+STORE_INFO_FILE = 'store_info.json'
+
+def coordinate_cell_keys(latitude, longitude):
+    """
+    Args:
+    latitude (array-like): latitudes in degrees.
+    longitude (array-like): longitudes in degrees.
+
+    Returns:
+    An int64 array with the spatial bucket of each coordinate.
+    Two coordinates share a bucket exactly when their values rounded to 3.d.p are equal.
+    Coordinates that are NaN get the key -1.
+    """
+    latitude = np.asarray(latitude, dtype='float64')
+    longitude = np.asarray(longitude, dtype='float64')
+    valid = np.isfinite(latitude) & np.isfinite(longitude)
+
+    lat_cell = np.rint(np.where(valid, latitude, 0) * CELL_SCALE).astype('int64') + 90 * CELL_SCALE
+    lon_cell = np.rint(np.where(valid, longitude, 0) * CELL_SCALE).astype('int64') + 180 * CELL_SCALE
+    keys = lat_cell * (360 * CELL_SCALE + 1) + lon_cell
+
+    return np.where(valid, keys, -1)
+
+def build_postcode_store(uk_post_df, store_dir=POSTCODE_STORE_DIR):
+    """
+    Args:
+    uk_post_df (pandas.DataFrame()): the cleaned uk postcode df, with 'Postcode', 'Latitude' and 'Longitude' columns.
+    store_dir (str): the folder the binary store is written to.
+
+    Returns:
+    The store_dir. The folder holds one .npy file per array:
+    - 'postcode': the postcodes as fixed-width bytes, sorted.
+    - 'latitude_e6', 'longitude_e6': int32 coordinates in micro-degrees, in the same order as 'postcode'.
+    - 'cell_keys', 'cell_order': the spatial bucket index, the sorted bucket keys and the positions of the postcodes in them.
+    Within a bucket, postcodes keep the order of uk_post_df, so the first one is the first in the source file.
+    The store is written to a temporary folder which then replaces store_dir, so the files of an earlier store that
+    other workers have memory-mapped are never rewritten, and a store is never a mix of two builds.
+    """
+    parent_dir = os.path.dirname(os.path.abspath(store_dir))
+    os.makedirs(parent_dir, exist_ok=True)
+    build_dir = tempfile.mkdtemp(dir=parent_dir, prefix=f'.{os.path.basename(store_dir)}-build-')
+
+    postcodes = uk_post_df['Postcode'].astype(str).str.upper().str.strip().to_numpy().astype('S')
+    latitude = uk_post_df['Latitude'].to_numpy(dtype='float64')
+    longitude = uk_post_df['Longitude'].to_numpy(dtype='float64')
+
+    postcode_order = np.argsort(postcodes, kind='stable')
+    # position of each source row in the postcode sorted arrays
+    sorted_position = np.empty_like(postcode_order)
+    sorted_position[postcode_order] = np.arange(len(postcode_order))
+
+    source_cells = coordinate_cell_keys(latitude, longitude)
+    cell_source_order = np.argsort(source_cells, kind='stable')
+
+    arrays = {
+        'postcode': postcodes[postcode_order],
+        'latitude_e6': np.rint(latitude[postcode_order] * COORDINATE_SCALE).astype('int32'),
+        'longitude_e6': np.rint(longitude[postcode_order] * COORDINATE_SCALE).astype('int32'),
+        'cell_keys': source_cells[cell_source_order],
+        'cell_order': sorted_position[cell_source_order].astype('int32'),
+    }
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(build_dir, f'{name}.npy'), array)
+        with open(os.path.join(build_dir, STORE_INFO_FILE), 'w') as f:
+            json.dump({'rows': int(len(postcodes)),
+                       'coordinate_scale': COORDINATE_SCALE,
+                       'cell_scale': CELL_SCALE}, f)
+
+        # a folder can only be renamed over an empty one, the earlier store is moved aside first
+        old_dir = None
+        if os.path.exists(store_dir):
+            old_dir = tempfile.mkdtemp(dir=parent_dir, prefix=f'.{os.path.basename(store_dir)}-old-')
+            os.replace(store_dir, old_dir)
+        os.replace(build_dir, store_dir)
+    finally:
+        if os.path.exists(build_dir):
+            shutil.rmtree(build_dir)
+    if old_dir is not None:
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    return store_dir
+
+def check_postcode_store(store, store_dir=POSTCODE_STORE_DIR):
+    """
+    Args:
+    store (dict): the memory-mapped arrays of the store.
+    store_dir (str): the folder of the store.
+
+    Returns:
+    None. A ValueError is raised if the arrays don't match the rows and scales of 'store_info.json', e.g. a store
+    written by another version of this module.
+    """
+    with open(os.path.join(store_dir, STORE_INFO_FILE)) as f:
+        info = json.load(f)
+    if info.get('coordinate_scale') != COORDINATE_SCALE or info.get('cell_scale') != CELL_SCALE:
+        raise ValueError(f"The postcode store in '{store_dir}' was built with other scales, build it again.")
+    wrong_rows = [name for name, array in store.items() if len(array) != info.get('rows')]
+    if wrong_rows:
+        raise ValueError(f"The arrays {', '.join(wrong_rows)} of the postcode store in '{store_dir}' don't have "
+                         f"{info.get('rows')} rows, build it again.")
+    return
+
+def load_postcode_store(store_dir=POSTCODE_STORE_DIR):
+    """
+    Args:
+    store_dir (str): the folder written by build_postcode_store.
+
+    Returns:
+    A dictionary with the array names as keys and read-only memory-mapped arrays as values.
+    Nothing is read until the arrays are used, and all the workers reading the store share the same pages.
+    The arrays are checked against 'store_info.json', see check_postcode_store.
+    """
+    store = {name: np.load(os.path.join(store_dir, f'{name}.npy'), mmap_mode='r') for name in STORE_ARRAYS}
+    check_postcode_store(store, store_dir)
+    return store
+
+def postcode_store_exists(store_dir=POSTCODE_STORE_DIR):
+    """
+    Returns:
+    True if all the arrays of the store are in store_dir and match its 'store_info.json'.
+    """
+    try:
+        load_postcode_store(store_dir)
+    except (OSError, ValueError):
+        return False
+    return True
+
+def store_coordinates(store, positions):
+    """
+    Args:
+    store (dict): a store from load_postcode_store.
+    positions (np.array): positions in the postcode sorted arrays.
+
+    Returns:
+    The latitudes and longitudes (float64 degrees) of the positions.
+    """
+    latitude = np.asarray(store['latitude_e6'][positions], dtype='float64') / COORDINATE_SCALE
+    longitude = np.asarray(store['longitude_e6'][positions], dtype='float64') / COORDINATE_SCALE
+    return latitude, longitude
+
+def cell_representatives(store, latitude, longitude):
+    """
+    Args:
+    store (dict): a store from load_postcode_store.
+    latitude (array-like): latitudes of the queries.
+    longitude (array-like): longitudes of the queries.
+
+    Returns:
+    An int64 array with, for each query, the position of the first postcode in the same 3.d.p bucket, or -1 if the bucket is empty.
+    """
+    keys = coordinate_cell_keys(latitude, longitude)
+    cell_keys = store['cell_keys']
+
+    idx = np.searchsorted(cell_keys, keys)
+    in_range = idx < len(cell_keys)
+    found = np.zeros(len(keys), dtype=bool)
+    found[in_range] = cell_keys[idx[in_range]] == keys[in_range]
+    found &= keys >= 0
+
+    positions = np.full(len(keys), -1, dtype='int64')
+    positions[found] = store['cell_order'][idx[found]]
+    return positions
@@ -0,0 +1,275 @@
+import logging
+import os
+import re
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from crime_id_index import hash_crime_ids
+
+PRIMARY_PARTITION_DIR = 'primary_partitioned'
+
+MANIFEST_FILE = '_manifest'
+
+# Sorted Crime ID hashes of a region and the manifest row of the partition holding each crime.
+CRIME_ID_FILE = '_crime_ids.npz'
+
+# Separator of the values listed in the manifest statistics.
+STATS_SEPARATOR = '|'
+
+OUTCOME_COLUMNS = ['Last outcome category', 'Broad Outcome Category']
+
+# File name of the partition of the rows without a crime type.
+NO_CRIME_TYPE_FILE = 'no-crime-type'
+
+def crime_type_file(crime_type):
+    """
+    Args:
+    crime_type (str): a crime type, e.g. 'Violence and sexual offences', or '' for the rows without one.
+
+    Returns:
+    The file name of the crime type partition within a month, e.g. 'violence-and-sexual-offences'.
+    """
+    return re.sub(r'[^a-z0-9]+', '-', crime_type.lower()).strip('-') or NO_CRIME_TYPE_FILE
+
+def partition_month(df):
+    """
+    Args:
+    df (pd.DataFrame): primary street df with 'Date year' and 'Date month' columns.
+
+    Returns:
+    A Series of the month of each row as 'YYYY-MM'.
+    """
+    return df['Date year'].astype(int).map('{:04d}'.format) + '-' + df['Date month'].astype(int).map('{:02d}'.format)
+
+def partition_outcomes(df):
+    """
+    Args:
+    df (pd.DataFrame): a partition df.
+
+    Returns:
+    The sorted outcomes ('Last outcome category' and 'Broad Outcome Category') in the partition, as listed in the
+    manifest.
+    """
+    outcomes = set()
+    for c in OUTCOME_COLUMNS:
+        if c in df.columns:
+            values = df[c].dropna().astype(str)
+            outcomes.update(values[values != ''])
+    return sorted(outcomes)
+
+def write_primary_partitions(region, df, partition_dir=PRIMARY_PARTITION_DIR):
+    """
+    Args:
+    region (str): the region name, e.g. 'metropolitan'.
+    df (pd.DataFrame): the primary street df of the region.
+    partition_dir (str): the folder of the partitioned primary layer.
+
+    Returns:
+    The manifest of the region as a DataFrame.
+    The region is written as one CSV file per month and crime type in 'partition_dir/region/YYYY-MM/<crime type>'
+    (see crime_type_file), the earlier partitions of the region are replaced. The manifest
+    ('partition_dir/region/_manifest') has one row per partition, with the statistics used to skip partitions in
+    queries: the month, the crime type, the file, the number of rows and the outcomes in the partition.
+    The Crime IDs of each partition are kept in 'partition_dir/region/_crime_ids.npz', see update_partitions.
+    The region is written to a hidden temporary folder that then replaces the region folder, so a failed write
+    leaves the earlier partitions as they were.
+    """
+    os.makedirs(partition_dir, exist_ok=True)
+    build_dir = tempfile.mkdtemp(dir=partition_dir, prefix=f'.{region}-build-')
+    try:
+        manifest_df = _write_region_partitions(build_dir, df)
+        # a folder can only be renamed over an empty one, the earlier partitions are moved aside first
+        region_dir = os.path.join(partition_dir, region)
+        old_dir = None
+        if os.path.exists(region_dir):
+            old_dir = tempfile.mkdtemp(dir=partition_dir, prefix=f'.{region}-old-')
+            os.replace(region_dir, old_dir)
+        os.replace(build_dir, region_dir)
+    finally:
+        if os.path.exists(build_dir):
+            shutil.rmtree(build_dir)
+    if old_dir is not None:
+        shutil.rmtree(old_dir, ignore_errors=True)
+    return manifest_df
+
+def _write_region_partitions(region_dir, df):
+    # the partitions, Crime ID file and manifest of write_primary_partitions, written to region_dir
+    months = partition_month(df).to_numpy()
+    crime_types = df['Crime type'].fillna('').astype(str).to_numpy()
+    manifest = []
+    crime_id_hashes = []
+    for (month, crime_type), partition_df in df.groupby([months, crime_types], sort=True):
+        file = os.path.join(month, crime_type_file(crime_type))
+        os.makedirs(os.path.join(region_dir, month), exist_ok=True)
+        partition_df.to_csv(os.path.join(region_dir, file))
+        manifest.append({'Month': month,
+                         'Crime type': crime_type,
+                         'File': file,
+                         'Rows': len(partition_df),
+                         'Outcomes': STATS_SEPARATOR.join(partition_outcomes(partition_df))})
+        if 'Crime ID' in partition_df.columns:
+            crime_id_hashes.append(hash_crime_ids(partition_df['Crime ID']))
+
+    if 'Crime ID' in df.columns:
+        hashes = np.concatenate(crime_id_hashes) if crime_id_hashes else np.array([], dtype='uint64')
+        partitions = np.repeat(np.arange(len(crime_id_hashes), dtype='int32'), [len(h) for h in crime_id_hashes])
+        order = np.argsort(hashes, kind='stable')
+        np.savez(os.path.join(region_dir, CRIME_ID_FILE), hashes=hashes[order], partitions=partitions[order])
+
+    manifest_df = pd.DataFrame(manifest, columns=['Month', 'Crime type', 'File', 'Rows', 'Outcomes'])
+    manifest_df.to_csv(os.path.join(region_dir, MANIFEST_FILE))
+    return manifest_df
+
+def read_partition_manifest(region, partition_dir=PRIMARY_PARTITION_DIR):
+    """
+    Args:
+    region (str): the region name.
+    partition_dir (str): the folder of the partitioned primary layer.
+
+    Returns:
+    The manifest of the region, see write_primary_partitions.
+    """
+    return pd.read_csv(os.path.join(partition_dir, region, MANIFEST_FILE), index_col=0, keep_default_na=False)
+
+def partitions_with_crimes(region, crime_ids, partition_dir=PRIMARY_PARTITION_DIR):
+    """
+    Args:
+    region (str): the region name.
+    crime_ids (array-like): the Crime IDs to find.
+    partition_dir (str): the folder of the partitioned primary layer.
+
+    Returns:
+    The sorted manifest rows of the partitions holding any of the crimes, found by binary search in the Crime ID
+    hashes of the region (all the partitions if the region has no Crime ID file).
+    """
+    path = os.path.join(partition_dir, region, CRIME_ID_FILE)
+    if not os.path.exists(path):
+        return np.arange(len(read_partition_manifest(region, partition_dir)))
+    with np.load(path) as crime_id_file:
+        hashes, partitions = crime_id_file['hashes'], crime_id_file['partitions']
+    if len(hashes) == 0:
+        return np.array([], dtype='int64')
+    wanted = hash_crime_ids(crime_ids)
+    positions = np.minimum(np.searchsorted(hashes, wanted), len(hashes) - 1)
+    return np.unique(partitions[positions[hashes[positions] == wanted]])
+
+def update_partitions(region, crime_ids, update_func, partition_dir=PRIMARY_PARTITION_DIR):
+    """
+    Args:
+    region (str): the region name.
+    crime_ids (array-like): the Crime IDs of the rows to update.
+    update_func (callable): takes a partition df and updates it in place, returns the number of rows changed.
+    The partitions are read as text, so the values that are not changed are written back as they were.
+    partition_dir (str): the folder of the partitioned primary layer.
+
+    Returns:
+    The number of partitions rewritten. Only the partitions holding the crimes (see partitions_with_crimes) are
+    read, and only the ones changed by update_func are written again, with their manifest statistics.
+    """
+    region_dir = os.path.join(partition_dir, region)
+    manifest_df = read_partition_manifest(region, partition_dir)
+    rewritten = 0
+    for row in partitions_with_crimes(region, crime_ids, partition_dir):
+        path = os.path.join(region_dir, manifest_df['File'].iloc[row])
+        partition_df = pd.read_csv(path, index_col=0, dtype=str, keep_default_na=False)
+        if not update_func(partition_df):
+            continue
+        partition_df.to_csv(f'{path}.tmp')
+        os.replace(f'{path}.tmp', path)
+        manifest_df.iloc[row, manifest_df.columns.get_loc('Outcomes')] = STATS_SEPARATOR.join(partition_outcomes(partition_df))
+        rewritten += 1
+
+    if rewritten:
+        manifest_path = os.path.join(region_dir, MANIFEST_FILE)
+        manifest_df.to_csv(f'{manifest_path}.tmp')
+        os.replace(f'{manifest_path}.tmp', manifest_path)
+    return rewritten
+
+def select_partitions(regions=None, start=None, end=None, crime_types=None, outcomes=None,
+                      partition_dir=PRIMARY_PARTITION_DIR):
+    """
+    Args:
+    regions (list): region names to keep, all when None.
+    start (str): first month to keep as 'YYYY-MM', no lower bound when None.
+    end (str): last month to keep as 'YYYY-MM', no upper bound when None.
+    crime_types (list): crime types to keep, all when None.
+    outcomes (list): outcomes to keep ('Last outcome category' or 'Broad Outcome Category'), all when None.
+    partition_dir (str): the folder of the partitioned primary layer.
+
+    Returns:
+    A list of (region, month, file path) of the partitions that can hold matching rows, one per month and crime
+    type. Only the manifests are read: regions are pruned by folder, months and crime types by partition, and
+    outcomes by the partition statistics. A region folder without a manifest is logged and skipped.
+    """
+    if not os.path.exists(partition_dir):
+        return []
+
+    selected = []
+    for region in sorted(os.listdir(partition_dir)):
+        # the hidden folders are regions being written
+        if region.startswith('.') or (regions is not None and region not in regions):
+            continue
+        if not os.path.exists(os.path.join(partition_dir, region, MANIFEST_FILE)):
+            logging.warning(f"Partitions of '{region}' skipped, '{MANIFEST_FILE}' is missing.")
+            continue
+        manifest_df = read_partition_manifest(region, partition_dir)
+        for row in manifest_df.itertuples(index=False):
+            month, crime_type, file, outcome_stats = row[0], row[1], row[2], row[4]
+            if (start is not None and month < start) or (end is not None and month > end):
+                continue
+            if crime_types is not None and crime_type not in crime_types:
+                continue
+            if outcomes is not None and not set(outcomes) & set(outcome_stats.split(STATS_SEPARATOR)):
+                continue
+            selected.append((region, month, os.path.join(partition_dir, region, file)))
+    return selected
+
+def iter_query_primary(regions=None, start=None, end=None, crime_types=None, outcomes=None, columns=None,
+                       partition_dir=PRIMARY_PARTITION_DIR):
+    """
+    Args:
+    regions, start, end, crime_types, outcomes, partition_dir: the filters, see select_partitions.
+    columns (list): columns to return, all when None. Only these (and the filtered ones) are parsed.
+
+    Returns:
+    An iterator of DataFrames, one per selected partition, holding the matching rows and a 'Region' column.
+    """
+    usecols = None
+    if columns is not None:
+        wanted = set(columns)
+        if crime_types is not None:
+            wanted.add('Crime type')
+        if outcomes is not None:
+            wanted.update(OUTCOME_COLUMNS)
+        usecols = lambda c: c in wanted
+
+    for region, month, path in select_partitions(regions, start, end, crime_types, outcomes, partition_dir):
+        df = pd.read_csv(path, index_col=0 if usecols is None else None, usecols=usecols)
+        keep = pd.Series(True, index=df.index)
+        if crime_types is not None:
+            keep &= df['Crime type'].isin(crime_types)
+        if outcomes is not None:
+            matches_outcome = pd.Series(False, index=df.index)
+            for c in OUTCOME_COLUMNS:
+                if c in df.columns:
+                    matches_outcome |= df[c].isin(outcomes)
+            keep &= matches_outcome
+        df = df[keep]
+        if columns is not None:
+            df = df[[c for c in columns if c in df.columns]]
+        yield df.assign(Region=region)
+
+def query_primary(regions=None, start=None, end=None, crime_types=None, outcomes=None, columns=None,
+                  partition_dir=PRIMARY_PARTITION_DIR):
+    """
+    Args:
+    regions, start, end, crime_types, outcomes, columns, partition_dir: see iter_query_primary.
+
+    Returns:
+    A single DataFrame of the matching rows, e.g. query_primary(['metropolitan'], '2023-01', '2023-12', ['Burglary']).
+    """
+    frames = list(iter_query_primary(regions, start, end, crime_types, outcomes, columns, partition_dir))
+    if not frames:
+        return pd.DataFrame(columns=(columns or []) + ['Region'])
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,170 @@
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import time
+from checkpoint import file_checksum
+
+REPORT_CACHE_DIR = 'report_cache'
+
+INDEX_FILE = '_index.json'
+
+DEFAULT_MAX_BYTES = 256 * 1024 ** 2
+
+def report_parameters(report_functions, modules=(), **options):
+    """
+    Args:
+    report_functions (list): the functions computing the reports, e.g. street_EDA.REPORT_FUNCTIONS.
+    modules (list): other modules the reports are computed with, e.g. grouped_counts for the numpy engine.
+    options: any other option the reports depend on.
+
+    Returns:
+    A dictionary describing the reports: the function names, a checksum of the files they and the modules are
+    defined in (so the cache is invalidated when the report code changes) and the options.
+    """
+    source_files = sorted({inspect.getsourcefile(f) for f in list(report_functions) + list(modules)})
+    return {'reports': [f.__name__ for f in report_functions],
+            'code': [file_checksum(path) for path in source_files],
+            'options': options}
+
+class ReportCache:
+    """
+    An on-disk cache of the reports of each region, keyed on the content of the region's primary file and the report
+    parameters. Each entry is a pickle of the reports, the least recently used entries are removed once the entries
+    take more than max_bytes.
+    """
+    def __init__(self, cache_dir=REPORT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._index = self._read_index()
+
+    def _read_index(self):
+        # 'files': path -> [size, mtime, checksum] of the fingerprinted files, 'entries': key -> last use time
+        path = os.path.join(self.cache_dir, INDEX_FILE)
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    return json.load(f)
+            except ValueError:
+                pass
+        return {'files': {}, 'entries': {}}
+
+    def _save_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = os.path.join(self.cache_dir, INDEX_FILE)
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(self._index, f)
+        os.replace(f'{path}.tmp', path)
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.pkl')
+
+    def fingerprint(self, path, params=None):
+        """
+        Args:
+        path (str): the input file of the reports, e.g. a primary region file.
+        params (dict): the report parameters, see report_parameters.
+
+        Returns:
+        The cache key of the reports of this file content with these parameters.
+        The file is only hashed again when its size or modification time changed since it was last fingerprinted.
+        """
+        stat = os.stat(path)
+        known = self._index['files'].get(os.path.abspath(path))
+        if known is not None and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+            checksum = known[2]
+        else:
+            checksum = file_checksum(path)
+            self._index['files'][os.path.abspath(path)] = [stat.st_size, stat.st_mtime_ns, checksum]
+            self._save_index()
+        return hashlib.sha256(json.dumps([checksum, params], sort_keys=True, default=str).encode()).hexdigest()[:32]
+
+    def get(self, key):
+        """
+        Args:
+        key (str): a key from fingerprint.
+
+        Returns:
+        The cached reports, or None if they are not in the cache.
+        """
+        path = self._entry_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                reports = pickle.load(f)
+        except Exception:
+            # a damaged entry (truncated, or naming a class that no longer exists, ...) is a miss, it is replaced
+            # by the next put
+            os.remove(path)
+            return None
+        self._index['entries'][key] = time.time()
+        self._save_index()
+        return reports
+
+    def put(self, key, reports):
+        """
+        Args:
+        key (str): a key from fingerprint.
+        reports: the reports to cache, e.g. the dictionary from street_EDA.create_region_reports.
+
+        Returns:
+        None. The least recently used entries are then evicted down to max_bytes.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._entry_path(key)
+        with open(f'{path}.tmp', 'wb') as f:
+            pickle.dump(reports, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f'{path}.tmp', path)
+        self._index['entries'][key] = time.time()
+        self.evict()
+        return
+
+    def evict(self):
+        """
+        Returns:
+        The number of entries removed. The entry files on disk are used for the sizes, so entries written by
+        another process are counted too.
+        """
+        if not os.path.exists(self.cache_dir):
+            return 0
+        entries = {}
+        for f in os.listdir(self.cache_dir):
+            if f.endswith('.pkl'):
+                entries[f[:-len('.pkl')]] = os.path.getsize(os.path.join(self.cache_dir, f))
+
+        total_bytes = sum(entries.values())
+        removed = 0
+        for key in sorted(entries, key=lambda k: self._index['entries'].get(k, 0)):
+            if total_bytes <= self.max_bytes:
+                break
+            os.remove(self._entry_path(key))
+            total_bytes -= entries[key]
+            removed += 1
+
+        self._index['entries'] = {k: t for k, t in self._index['entries'].items()
+                                  if os.path.exists(self._entry_path(k))}
+        self._save_index()
+        return removed
+
+    def size_bytes(self):
+        """
+        Returns:
+        The total size of the cached entries.
+        """
+        if not os.path.exists(self.cache_dir):
+            return 0
+        return sum(os.path.getsize(os.path.join(self.cache_dir, f)) for f in os.listdir(self.cache_dir)
+                   if f.endswith('.pkl'))
+
+    def clear(self):
+        """
+        Returns:
+        None. All the entries are removed.
+        """
+        if os.path.exists(self.cache_dir):
+            for f in os.listdir(self.cache_dir):
+                os.remove(os.path.join(self.cache_dir, f))
+        self._index = {'files': {}, 'entries': {}}
+        return
@@ -0,0 +1,222 @@
+import argparse
+import importlib.util
+import json
+import re
+import zlib
+
+# Only the standard library is imported here, the pipeline (and pandas) is imported once the arguments are parsed,
+# so '--help' and argument errors are instant.
+
+PIPELINE_STAGES = ['staging', 'primary', 'reporting', 'all']
+
+OUTPUT_FORMATS = ['csv', 'parquet']
+
+ENGINES = ['pandas', 'numpy']
+
+DEFAULT_CONFIG = {
+    'start': 'staging',            # first stage to run
+    'goal': 'all',                 # last stage to run
+    'regions': None,               # region names to process, e.g. ['kent', 'metropolitan'], all when None
+    'start_month': None,           # first month of raw data to stage, 'YYYY-MM'
+    'end_month': None,             # last month of raw data to stage, 'YYYY-MM'
+    'shard_index': 0,              # this machine's shard, from 0 to shard_count - 1
+    'shard_count': 1,              # number of machines the regions are split across
+    'workers': 2,                  # reader, transform and writer threads of each streaming stage
+    'queue_size': 4,               # regions held between the streaming steps
+    'report_cache_mb': 256,        # disk space of the cache of the reports, 0 to disable it
+    'output_format': 'csv',        # format of the reporting files
+    'engine': 'pandas',            # counting engine of the reports, 'numpy' counts on integer-encoded keys
+    'resume': True,                # skip the units completed by earlier runs, see checkpoint.py
+    'apply_outcomes': True,        # join the latest outcome of each crime to the street data
+    'crime_id_index_path': None,   # persistent Crime ID index, for adding new months incrementally
+}
+
+MONTH_PATTERN = re.compile(r'^\d{4}-(0[1-9]|1[0-2])$')
+
+def region_in_shard(region, shard_index=0, shard_count=1):
+    """
+    Args:
+    region (str): the region name, e.g. 'metropolitan'.
+    shard_index (int): the shard of this run, from 0 to shard_count - 1.
+    shard_count (int): the number of shards.
+
+    Returns:
+    True if the region belongs to the shard. The shard is the crc32 of the name modulo shard_count, so every machine
+    gets the same split without coordination.
+    """
+    return zlib.crc32(region.encode()) % shard_count == shard_index
+
+def region_selected(region, regions=None, shard=(0, 1)):
+    """
+    Args:
+    region (str): the region name.
+    regions (list): the regions to process, all when None.
+    shard (tuple): (shard_index, shard_count) of this run.
+
+    Returns:
+    True if the region is processed by this run.
+    """
+    return (regions is None or region in regions) and region_in_shard(region, *shard)
+
+def month_selected(month, start_month=None, end_month=None):
+    """
+    Args:
+    month (str): a month as 'YYYY-MM'.
+    start_month (str): first month kept, no lower bound when None.
+    end_month (str): last month kept, no upper bound when None.
+
+    Returns:
+    True if the month is in the range.
+    """
+    return (start_month is None or month >= start_month) and (end_month is None or month <= end_month)
+
+def shard_suffix(shard):
+    """
+    Args:
+    shard (tuple): (shard_index, shard_count) of this run.
+
+    Returns:
+    '' for an unsharded run, otherwise e.g. '_shard1of4'. It is added to the checkpoint and report files shared by
+    all regions, so sharded runs writing to the same folders don't overwrite each other.
+    """
+    shard_index, shard_count = shard
+    return '' if shard_count == 1 else f'_shard{shard_index}of{shard_count}'
+
+def parse_shard(value):
+    """
+    Args:
+    value (str): a shard as 'INDEX/COUNT', e.g. '1/4'.
+
+    Returns:
+    The (shard_index, shard_count) tuple.
+    """
+    try:
+        shard_index, shard_count = (int(v) for v in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid shard '{value}', expected INDEX/COUNT, e.g. 0/4")
+    return shard_index, shard_count
+
+def build_arg_parser():
+    """
+    Returns:
+    The argument parser of the pipeline. The options are not given a default, so only the ones passed on the
+    command line override the config file.
+    """
+    parser = argparse.ArgumentParser(
+        description="Run the police crime data pipeline: staging -> primary -> reporting.",
+        argument_default=argparse.SUPPRESS)
+    parser.add_argument('--config', help="JSON file with any of the run options below, e.g. {\"workers\": 8}.")
+    parser.add_argument('--start', choices=PIPELINE_STAGES, help="first stage to run (default: staging).")
+    parser.add_argument('--goal', choices=PIPELINE_STAGES, help="last stage to run (default: all).")
+    parser.add_argument('--regions', nargs='+', metavar='REGION', help="only process these regions, e.g. kent metropolitan.")
+    parser.add_argument('--start-month', dest='start_month', metavar='YYYY-MM', help="first month of raw data to stage.")
+    parser.add_argument('--end-month', dest='end_month', metavar='YYYY-MM', help="last month of raw data to stage.")
+    parser.add_argument('--shard', type=parse_shard, metavar='INDEX/COUNT',
+                        help="only process the regions of this shard, e.g. 0/4 on the first of 4 machines.")
+    parser.add_argument('--workers', type=int, help="threads per streaming step (default: 2).")
+    parser.add_argument('--queue-size', dest='queue_size', type=int, help="regions held between streaming steps (default: 4).")
+    parser.add_argument('--report-cache-mb', dest='report_cache_mb', type=float,
+                        help="disk space of the report cache, reports of unchanged primary files are reused (default: 256, 0 to disable).")
+    parser.add_argument('--output-format', dest='output_format', choices=OUTPUT_FORMATS,
+                        help="format of the reporting files (default: csv, parquet needs pyarrow or fastparquet).")
+    parser.add_argument('--engine', choices=ENGINES,
+                        help="counting engine of the reports (default: pandas, numpy is faster on large regions).")
+    parser.add_argument('--no-resume', dest='resume', action='store_false',
+                        help="process every region again, instead of skipping the ones completed by earlier runs.")
+    parser.add_argument('--no-outcomes', dest='apply_outcomes', action='store_false',
+                        help="don't join the outcomes data to the street data.")
+    parser.add_argument('--crime-id-index', dest='crime_id_index_path', metavar='PATH',
+                        help="persistent Crime ID index (.npy), new months are appended to the staged data.")
+    parser.add_argument('--print-config', dest='print_config', action='store_true',
+                        help="print the resolved configuration and exit.")
+    return parser
+
+def load_config_file(path):
+    """
+    Args:
+    path (str): a JSON file holding a dictionary of run options (keys of DEFAULT_CONFIG).
+
+    Returns:
+    The dictionary of options. A ValueError is raised for unknown options.
+    """
+    with open(path) as f:
+        config = json.load(f)
+    if not isinstance(config, dict):
+        raise ValueError(f"'{path}' should hold a JSON object of run options.")
+    unknown = sorted(set(config) - set(DEFAULT_CONFIG))
+    if unknown:
+        raise ValueError(f"Unknown options in '{path}': {', '.join(unknown)}.")
+    return config
+
+def validate_config(config):
+    """
+    Args:
+    config (dict): the resolved run options.
+
+    Returns:
+    None. A ValueError is raised for the first invalid option.
+    """
+    if config['start'] not in PIPELINE_STAGES or config['goal'] not in PIPELINE_STAGES:
+        raise ValueError(f"start and goal should be one of {', '.join(PIPELINE_STAGES)}.")
+    if PIPELINE_STAGES.index(config['start']) > PIPELINE_STAGES.index(config['goal']):
+        raise ValueError("goal cannot be before start.")
+    for key in ['start_month', 'end_month']:
+        if config[key] is not None and not MONTH_PATTERN.match(config[key]):
+            raise ValueError(f"{key} should be a month as YYYY-MM, got '{config[key]}'.")
+    if not 0 <= config['shard_index'] < config['shard_count']:
+        raise ValueError(f"shard index {config['shard_index']} should be between 0 and {config['shard_count'] - 1}.")
+    if config['shard_count'] > 1 and config['crime_id_index_path']:
+        # the shards would overwrite each other's index, and skip the Crime IDs of the other shards' regions
+        raise ValueError("crime_id_index_path cannot be used with shards, add new months without sharding.")
+    if config['workers'] < 1 or config['queue_size'] < 1:
+        raise ValueError("workers and queue_size should be at least 1.")
+    if config['report_cache_mb'] < 0:
+        raise ValueError("report_cache_mb cannot be negative.")
+    if config['output_format'] not in OUTPUT_FORMATS:
+        raise ValueError(f"output_format should be one of {', '.join(OUTPUT_FORMATS)}.")
+    if config['engine'] not in ENGINES:
+        raise ValueError(f"engine should be one of {', '.join(ENGINES)}.")
+    if config['output_format'] == 'parquet' and not any(importlib.util.find_spec(m) for m in ['pyarrow', 'fastparquet']):
+        raise ValueError("output_format 'parquet' needs pyarrow or fastparquet to be installed.")
+    return
+
+def parse_config(argv=None):
+    """
+    Args:
+    argv (list): the command line arguments, sys.argv[1:] when None.
+
+    Returns:
+    The run options: DEFAULT_CONFIG, updated by the config file, updated by the command line options.
+    Invalid options exit with a usage message.
+    """
+    parser = build_arg_parser()
+    args = vars(parser.parse_args(argv))
+
+    config = dict(DEFAULT_CONFIG)
+    try:
+        if 'config' in args:
+            config.update(load_config_file(args.pop('config')))
+        if 'shard' in args:
+            config['shard_index'], config['shard_count'] = args.pop('shard')
+        config['print_config'] = args.pop('print_config', False)
+        config.update(args)
+        validate_config(config)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    return config
+
+def main(argv=None):
+    """
+    Command line entry point, e.g. 'python run_pipeline.py --goal primary --regions kent --workers 8'.
+    """
+    config = parse_config(argv)
+    if config.pop('print_config'):
+        print(json.dumps(config, indent=1))
+        return
+
+    import pipeline
+    pipeline.main(config['start'], config['goal'], config['resume'], config)
+    return
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+import logging
+import queue
+import threading
+
+# Marks the end of the work stream for the next pool of workers.
+_END_OF_STREAM = object()
+
+def _start_pool(n_workers, target, name):
+    """
+    Args:
+    n_workers(int): number of threads to start.
+    target(callable): the function each thread runs.
+    name(str): prefix used for the thread names.
+
+    Returns:
+    A list of the started threads.
+    """
+    threads = [threading.Thread(target=target, name=f'{name}-{i}', daemon=True) for i in range(max(1, n_workers))]
+    for t in threads:
+        t.start()
+    return threads
+
+def run_streaming_stage(keys, read_func, transform_func, write_func,
+                        reader_workers=2, transform_workers=2, writer_workers=2, queue_size=4):
+    """
+    Args:
+    keys(list): the units of work, e.g. region names or file names.
+    read_func(callable): takes a key and returns the loaded data.
+    transform_func(callable): takes a key and the loaded data, and returns the transformed data. When None, the
+    loaded data goes straight to the writers and no transform threads are started.
+    write_func(callable): takes a key and the transformed data, and stores it.
+    reader_workers(int): number of threads reading the inputs.
+    transform_workers(int): number of threads transforming the data.
+    writer_workers(int): number of threads writing the outputs.
+    queue_size(int): maximum number of items waiting between two pools, this bounds the memory used.
+
+    Returns:
+    A dictionary with the 'completed' keys (list) and the 'failed' keys (dict of key: error message).
+    The reads, transforms and writes of different keys overlap, so disk I/O and compute run at the same time.
+    A key that fails in any step is logged and skipped, the other keys carry on.
+    """
+    key_q = queue.Queue()
+    write_q = queue.Queue(maxsize=queue_size)
+    read_q = queue.Queue(maxsize=queue_size) if transform_func is not None else write_q
+
+    completed = []
+    failed = {}
+    lock = threading.Lock()
+
+    def record_failure(key, step, e):
+        logging.error(f"Failed to {step} {key}: {e}")
+        with lock:
+            failed[key] = f'{step}: {e}'
+
+    for key in keys:
+        key_q.put(key)
+
+    def reader():
+        while True:
+            try:
+                key = key_q.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                data = read_func(key)
+            except Exception as e:
+                record_failure(key, 'read', e)
+                continue
+            read_q.put((key, data))
+
+    def transformer():
+        while True:
+            item = read_q.get()
+            if item is _END_OF_STREAM:
+                return
+            key, data = item
+            try:
+                data = transform_func(key, data)
+            except Exception as e:
+                record_failure(key, 'transform', e)
+                continue
+            write_q.put((key, data))
+
+    def writer():
+        while True:
+            item = write_q.get()
+            if item is _END_OF_STREAM:
+                return
+            key, data = item
+            try:
+                write_func(key, data)
+            except Exception as e:
+                record_failure(key, 'write', e)
+                continue
+            with lock:
+                completed.append(key)
+
+    readers = _start_pool(reader_workers, reader, 'reader')
+    transformers = _start_pool(transform_workers, transformer, 'transform') if transform_func is not None else []
+    writers = _start_pool(writer_workers, writer, 'writer')
+
+    # Shut the pools down in order, each one once the pool feeding it has finished.
+    for t in readers:
+        t.join()
+    for _ in transformers:
+        read_q.put(_END_OF_STREAM)
+    for t in transformers:
+        t.join()
+    for _ in writers:
+        write_q.put(_END_OF_STREAM)
+    for t in writers:
+        t.join()
+
+    return {'completed': completed, 'failed': failed}
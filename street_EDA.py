@@ -1,17 +1,21 @@
 import os
 import pandas as pd
 import numpy as np
+from grouped_counts import *
 
-def create_top_5_crime_lst(df):
+def create_top_5_crime_lst(df, engine='pandas'):
     """
     Creates a list of the top 5 most frequent crime types.
     
     Args:
         df (pd.DataFrame): DataFrame containing crime data with a 'Crime type' column.
+        engine (str): 'pandas', or 'numpy' to count on integer-encoded keys (see grouped_counts), df can then be an EncodedRegion.
         
     Returns:
         list: A list of the top 5 crime types.
     """
+    if engine == 'numpy':
+        return value_counts(encoded_region(df), 'Crime type').head().index.tolist()
     top_5_crime_lst = df['Crime type'].value_counts().head().index.tolist()
     return top_5_crime_lst
 
@@ -29,99 +33,163 @@ def create_top_5_crime_df(df):
     top_5_crime_df = df[df['Crime type'].isin(top_5_crime_lst)]
     return top_5_crime_df
 
-def create_crime_count_year_month_df(df):
+def create_crime_count_year_month_df(df, engine='pandas'):
     """
     Creates a DataFrame counting crimes per year and month, grouped by crime type.
     
     Args:
         df (pd.DataFrame): DataFrame containing crime data.
+        engine (str): 'pandas' or 'numpy', see create_top_5_crime_lst.
         
     Returns:
         pd.DataFrame: A DataFrame with crime counts grouped by year, month, and crime type.
     """
-    year_month_crime_count_df = df.groupby(['Date', 'Crime type']).agg('count')[['Crime ID']].reset_index()
+    if engine == 'numpy':
+        year_month_crime_count_df = grouped_count_df(encoded_region(df), ['Date', 'Crime type'], 'Crime ID', name='Crime ID')
+    else:
+        year_month_crime_count_df = df.groupby(['Date', 'Crime type']).agg('count')[['Crime ID']].reset_index()
     year_month_crime_count_df = year_month_crime_count_df.sort_values(by='Date', ascending=True)
     return year_month_crime_count_df
 
-def create_top_5_crime_count_year_month_df(df):
+def create_top_5_crime_count_year_month_df(df, engine='pandas'):
     """
     Creates a DataFrame of the top 5 crimes, counting occurrences per year and month.
     
     Args:
         df (pd.DataFrame): DataFrame containing crime data.
+        engine (str): 'pandas' or 'numpy', see create_top_5_crime_lst.
         
     Returns:
         pd.DataFrame: A DataFrame with crime counts for the top 5 crime types grouped by year and month.
     """
-    top_5_crime_lst = create_top_5_crime_lst(df)
-    year_month_crime_count_df = create_crime_count_year_month_df(df)
+    if engine == 'numpy':
+        df = encoded_region(df)
+    top_5_crime_lst = create_top_5_crime_lst(df, engine)
+    year_month_crime_count_df = create_crime_count_year_month_df(df, engine)
     top_5_year_month_crime_count_df = year_month_crime_count_df[year_month_crime_count_df['Crime type'].isin(top_5_crime_lst)]
     return top_5_year_month_crime_count_df
 
-def create_date_location_hotspots_df(df):
+def create_date_location_count_grid(df):
+    """
+    Counts crimes by location and date on integer-encoded keys, the numpy engine of create_date_location_hotspots_df.
+    
+    Args:
+        df (pd.DataFrame): DataFrame (or EncodedRegion) containing crime data.
+        
+    Returns:
+        tuple: The counts as a locations x dates array, the sorted locations and the sorted dates.
+        Only the locations and dates of rows having both are kept, as with groupby. The array is float
+        when a combination has no crime, as the NaN filled by unstack makes it.
+    """
+    region = encoded_region(df)
+    location_codes, locations = region.codes('Location')
+    date_codes, dates = region.codes('Date')
+    combined, valid = combine_codes([location_codes, date_codes], (len(locations), len(dates)))
+
+    grid = np.bincount(combined[valid], minlength=len(locations) * len(dates)).reshape(len(locations), len(dates))
+    present_locations = np.flatnonzero(grid.any(axis=1))
+    present_dates = np.flatnonzero(grid.any(axis=0))
+    grid = grid[np.ix_(present_locations, present_dates)]
+    if (grid == 0).any():
+        grid = grid.astype('float64')
+    return grid, locations.take(present_locations), dates.take(present_dates)
+
+def create_date_location_hotspots_df(df, engine='pandas'):
     """
     Creates a pivot table of crime counts by location and date.
     
     Args:
         df (pd.DataFrame): DataFrame containing crime data.
+        engine (str): 'pandas' or 'numpy', see create_top_5_crime_lst.
         
     Returns:
         pd.DataFrame: A pivot table DataFrame with locations as rows and dates as columns.
     """
+    if engine == 'numpy':
+        grid, locations, dates = create_date_location_count_grid(df)
+        return pd.DataFrame(grid, index=locations.rename('Location'), columns=dates.rename('Date'))
     date_location_hotspots_df = df.groupby(['Location', 'Date']).size().unstack().fillna(0)
     return date_location_hotspots_df
 
-def create_top_5_crime_location_lst(df):
+def create_top_5_crime_location_lst(df, engine='pandas'):
     """
     Creates a list of the top 5 locations with the most crimes, excluding 'No Info'.
     
     Args:
         df (pd.DataFrame): DataFrame containing crime data.
+        engine (str): 'pandas' or 'numpy', see create_top_5_crime_lst.
         
     Returns:
         pd.Index: An index object containing the top 5 crime locations.
     """
-    top_crime_location_lst = df.groupby('Location').agg('count')[['Crime ID']].sort_values(by='Crime ID', ascending=False).drop(index='No Info').head().index
+    if engine == 'numpy':
+        location_count_df = grouped_count_df(encoded_region(df), ['Location'], 'Crime ID', name='Crime ID').set_index('Location')
+    else:
+        location_count_df = df.groupby('Location').agg('count')[['Crime ID']]
+    top_crime_location_lst = location_count_df.sort_values(by='Crime ID', ascending=False).drop(index='No Info').head().index
     return top_crime_location_lst
 
-def create_top_5_crime_count_location_date_df(df):
+def create_top_5_crime_count_location_date_df(df, engine='pandas'):
     """
     Creates a DataFrame of crime counts by date for the top 5 crime locations.
     
     Args:
         df (pd.DataFrame): DataFrame containing crime data.
+        engine (str): 'pandas' or 'numpy', see create_top_5_crime_lst. The numpy engine only builds the rows of
+        the top 5 locations, with the index they have in the full melted table.
         
     Returns:
         pd.DataFrame: A DataFrame with crime counts by date for the top 5 locations.
     """
+    if engine == 'numpy':
+        region = encoded_region(df)
+        df_top_crime_location_ls = create_top_5_crime_location_lst(region, engine)
+        grid, locations, dates = create_date_location_count_grid(region)
+        top_rows = np.flatnonzero(locations.isin(df_top_crime_location_ls))
+        # melt lists the locations of the first date, then of the second date, ...
+        location_position = np.tile(top_rows, len(dates))
+        date_position = np.repeat(np.arange(len(dates)), len(top_rows))
+        return pd.DataFrame({'Location': locations.take(location_position),
+                             'Date': dates.take(date_position),
+                             'Crime Count': grid[location_position, date_position]},
+                            index=date_position * len(locations) + location_position)
+
     df_top_crime_location_ls = create_top_5_crime_location_lst(df)
     df_crime_hotspots_df_long = create_date_location_hotspots_df(df).reset_index().melt(id_vars='Location', var_name='Date', value_name='Crime Count')
     top_5_crime_count_location_date_df = df_crime_hotspots_df_long[df_crime_hotspots_df_long['Location'].isin(df_top_crime_location_ls)]
     return top_5_crime_count_location_date_df
 
-def create_top_5_crime_count_LSOA_name_df(df):
+def create_top_5_crime_count_LSOA_name_df(df, engine='pandas'):
     """
     Creates a DataFrame of the top 5 LSOA names by crime count.
     
     Args:
         df (pd.DataFrame): DataFrame containing crime data.
+        engine (str): 'pandas' or 'numpy', see create_top_5_crime_lst.
         
     Returns:
         pd.DataFrame: A DataFrame of the top 5 LSOA names by crime count.
     """
-    top_5_LSOA_name_df = df.groupby('LSOA name').count()[['Crime ID']].sort_values(by='Crime ID', ascending=False).head()
+    if engine == 'numpy':
+        LSOA_count_df = grouped_count_df(encoded_region(df), ['LSOA name'], 'Crime ID', name='Crime ID').set_index('LSOA name')
+    else:
+        LSOA_count_df = df.groupby('LSOA name').count()[['Crime ID']]
+    top_5_LSOA_name_df = LSOA_count_df.sort_values(by='Crime ID', ascending=False).head()
     return top_5_LSOA_name_df
 
-def create_longitute_lantitude_crime_count_df(df):
+def create_longitute_lantitude_crime_count_df(df, engine='pandas'):
     """
     Aggregates crime counts by latitude and longitude.
     
     Args:
         df (pd.DataFrame): DataFrame containing crime data with 'Longitude' and 'Latitude' columns.
+        engine (str): 'pandas' or 'numpy', see create_top_5_crime_lst.
         
     Returns:
         pd.DataFrame: A DataFrame with crime counts grouped by latitude and longitude.
     """
+    if engine == 'numpy':
+        return grouped_count_df(encoded_region(df), ['Longitude', 'Latitude'], name='Crime ID')
     longitute_lantitude_crime_count_df = df.groupby(['Longitude', 'Latitude']).size().reset_index(name='Crime ID')
     return longitute_lantitude_crime_count_df
 
@@ -140,40 +208,186 @@ def numeric_checked_longitute_lantitude_crime_count_df(df):
     df = df.dropna(subset=['Latitude', 'Longitude', 'Crime ID'])
     return df
 
-def create_numberic_checked_longitute_lantitude_crime_count_df(df):
+def create_numberic_checked_longitute_lantitude_crime_count_df(df, engine='pandas'):
     """
     Combines latitude and longitude crime counts with numeric checks.
     
     Args:
         df (pd.DataFrame): DataFrame containing crime data.
+        engine (str): 'pandas' or 'numpy', see create_top_5_crime_lst.
         
     Returns:
         pd.DataFrame: A DataFrame with numeric latitude and longitude values and crime counts.
     """
-    df = numeric_checked_longitute_lantitude_crime_count_df(create_longitute_lantitude_crime_count_df(df))
+    df = numeric_checked_longitute_lantitude_crime_count_df(create_longitute_lantitude_crime_count_df(df, engine))
     return df
 
-def loop_all_functions(regions_dict):
+def coordinate_tile_ids(longitude, latitude, zoom):
     """
-    Loops through the provided functions, applying them to each region's DataFrame.
-    Saves the output to CSV files in the 'reporting_dataframe' directory.
+    Converts coordinates to Web Mercator (slippy map) tiles at a zoom level, encoded as a quadkey-like integer.
+    The bits of the tile x and y are interleaved, so the parent tile at zoom - 1 is tile_id >> 2.
+    
+    Args:
+        longitude (array-like): Longitudes in degrees.
+        latitude (array-like): Latitudes in degrees.
+        zoom (int): Zoom level (0 to 31), the tiles are about 40000 km / 2**zoom wide at the equator.
+        
+    Returns:
+        np.ndarray: An int64 array of tile IDs.
+    """
+    n = 1 << zoom
+    lon = np.asarray(longitude, dtype='float64')
+    lat = np.radians(np.clip(np.asarray(latitude, dtype='float64'), -85.05112878, 85.05112878))
+
+    x = np.clip(np.floor((lon + 180.0) / 360.0 * n), 0, n - 1).astype('int64')
+    y = np.clip(np.floor((1.0 - np.arcsinh(np.tan(lat)) / np.pi) / 2.0 * n), 0, n - 1).astype('int64')
+
+    tile_id = np.zeros(len(x), dtype='int64')
+    for bit in range(zoom):
+        tile_id |= ((x >> bit) & 1) << (2 * bit)
+        tile_id |= ((y >> bit) & 1) << (2 * bit + 1)
+    return tile_id
+
+def tile_id_to_xy(tile_id, zoom):
+    """
+    Decodes tile IDs from coordinate_tile_ids back to the tile x and y.
+    
+    Args:
+        tile_id (array-like): Tile IDs.
+        zoom (int): Zoom level the IDs were created at.
+        
+    Returns:
+        tuple: Two int64 arrays, the tile x and y.
+    """
+    tile_id = np.asarray(tile_id, dtype='int64')
+    x = np.zeros(len(tile_id), dtype='int64')
+    y = np.zeros(len(tile_id), dtype='int64')
+    for bit in range(zoom):
+        x |= ((tile_id >> (2 * bit)) & 1) << bit
+        y |= ((tile_id >> (2 * bit + 1)) & 1) << bit
+    return x, y
+
+def create_tile_crime_count_df(df, zooms=(10, 13, 16), engine='pandas'):
+    """
+    Aggregates crime counts into map tiles at several zoom levels, by date and crime type.
+    Coordinates are made numeric first, the tiles are computed once at the finest zoom and the coarser ones derived from them.
+    
+    Args:
+        df (pd.DataFrame): DataFrame containing crime data with 'Longitude', 'Latitude', 'Date' and 'Crime type' columns.
+        zooms (tuple): Zoom levels to aggregate at, e.g. 10 (about 39 km tiles), 13 (about 4.9 km), 16 (about 600 m).
+        engine (str): 'pandas' or 'numpy', see create_top_5_crime_lst.
+        
+    Returns:
+        pd.DataFrame: A DataFrame with 'Zoom', 'Tile ID', 'Date', 'Crime type' and 'Crime Count' columns.
+    """
+    if engine == 'numpy':
+        region = encoded_region(df)
+        df = region.df
+    longitude = pd.to_numeric(df['Longitude'], errors='coerce')
+    latitude = pd.to_numeric(df['Latitude'], errors='coerce')
+    valid = (longitude.notna() & latitude.notna()).to_numpy()
+
+    finest = max(zooms)
+    finest_tile_id = coordinate_tile_ids(longitude[valid], latitude[valid], finest)
+    if engine != 'numpy':
+        keys_df = df.loc[valid, ['Date', 'Crime type']].reset_index(drop=True)
+
+    tile_count_dfs = []
+    for zoom in sorted(zooms):
+        if engine == 'numpy':
+            # the Date and Crime type codes of the region are reused at each zoom
+            region.set_key('Tile ID', finest_tile_id >> (2 * (finest - zoom)), valid)
+            tile_count_df = grouped_count_df(region, ['Tile ID', 'Date', 'Crime type'], name='Crime Count')
+        else:
+            keys_df['Tile ID'] = finest_tile_id >> (2 * (finest - zoom))
+            tile_count_df = keys_df.groupby(['Tile ID', 'Date', 'Crime type']).size().reset_index(name='Crime Count')
+        tile_count_df.insert(0, 'Zoom', zoom)
+        tile_count_dfs.append(tile_count_df)
+
+    return pd.concat(tile_count_dfs, ignore_index=True)
+
+def write_report(df, file_name, output_format='csv'):
+    """
+    Saves a report in the chosen format.
+
+    Args:
+        df (pd.DataFrame): the report.
+        file_name (str): the report file name, e.g. 'reporting_kent_crime_trend_df'.
+        output_format (str): 'csv' (the file name is kept as it is) or 'parquet' ('.parquet' is added, needs pyarrow or fastparquet).
+
+    Returns:
+        None
+    """
+    if output_format == 'csv':
+        df.to_csv(file_name)
+    elif output_format == 'parquet':
+        df.to_parquet(f'{file_name}.parquet')
+    else:
+        raise ValueError(f"Unknown output format '{output_format}', use 'csv' or 'parquet'.")
+    return
+
+REPORT_FUNCTIONS = [create_top_5_crime_count_year_month_df,
+                    create_top_5_crime_count_location_date_df,
+                    create_top_5_crime_count_LSOA_name_df,
+                    create_numberic_checked_longitute_lantitude_crime_count_df,
+                    create_tile_crime_count_df]
+
+def create_region_reports(df, engine='pandas'):
+    """
+    Applies the report functions to a region's DataFrame.
+    
+    Args:
+        df (pd.DataFrame): DataFrame containing the crime data of one region.
+        engine (str): 'pandas', or 'numpy' to encode the key columns of the region once and count them with np.bincount.
+        
+    Returns:
+        dict: The report names (e.g. 'top_5_crime_count_LSOA_name_df') as keys and the reports as values.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}', use 'pandas' or 'numpy'.")
+    if engine == 'numpy':
+        df = EncodedRegion(df)
+    return {f.__name__.split("_", 1)[1]: f(df, engine=engine) for f in REPORT_FUNCTIONS}
+
+def write_region_reports(key, reports, output_format='csv', report_dir=''):
+    """
+    Saves the reports of a region as 'reporting_{region}_{report name}'.
     
     Args:
-        regions_dict (dict): Dictionary where keys are region names and values are DataFrames with crime data.
+        key (str): the region key, e.g. 'primary_kent_df'.
+        reports (dict): the reports from create_region_reports.
+        output_format (str): 'csv' or 'parquet', see write_report.
+        report_dir (str): the folder of the reports, the current directory by default.
         
     Returns:
         None
     """
-    report_functions = [create_top_5_crime_count_year_month_df,
-                        create_top_5_crime_count_location_date_df, 
-                        create_top_5_crime_count_LSOA_name_df, 
-                        create_numberic_checked_longitute_lantitude_crime_count_df]
+    for name, report_df in reports.items():
+        write_report(report_df, os.path.join(report_dir, f'reporting_{key.split("_")[1]}_{name}'), output_format)
+    return
+
+def loop_all_functions(regions_dict, output_format='csv', engine='pandas'):
+    """
+    Loops through the provided functions, applying them to each region's DataFrame.
+    Saves the output to CSV (or parquet) files in the 'reporting_dataframe' directory.
     
+    Args:
+        regions_dict (dict): Dictionary (or LazyLayer) where keys are region names and values are DataFrames with crime data.
+        output_format (str): 'csv' or 'parquet', see write_report.
+        engine (str): 'pandas' or 'numpy', see create_region_reports.
+        
+    Returns:
+        None
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine '{engine}', use 'pandas' or 'numpy'.")
+
     os.chdir('reporting_dataframe')
-    for f in report_functions:
+    try:
+        # regions in the outer loop, so a lazily loaded region is only read once
         for key, values in regions_dict.items():
-            street_df = f(values)
-            street_df.to_csv(f'reporting_{key.split("_")[1]}_{f.__name__.split("_", 1)[1]}')
-    os.chdir('../')
+            write_region_reports(key, create_region_reports(values, engine), output_format)
+    finally:
+        os.chdir('../')
     
     return
@@ -1,5 +1,11 @@
 import pandas as pd
+import numpy as np
 import os
+from collections import OrderedDict
+from collections.abc import Mapping
+
+# Coordinates outside this box are not in the UK.
+UK_BOUNDING_BOX = {'Latitude': (49.8, 60.9), 'Longitude': (-8.7, 1.8)}
 
 def extract_city_name_from_file():
     """
@@ -80,6 +86,35 @@ def combined_dataset(dataset_type):
     
     return regional_dic
 
+def index_police_data_files_by_type(dataset_types, data_dir='police_data'):
+    """
+    Args:
+    dataset_types (list): the types of data to index e.g. ['street', 'stop-and-search', 'outcomes']
+    data_dir (str): the folder containing the monthly police data folders.
+
+    Returns:
+    A dictionary with the dataset types as keys, and dictionaries of region names: file paths (ordered by month) as values.
+    police_data is walked once, and each file is routed to its dataset type by the suffix of its name.
+    The paths are built with os.path.join, so the files can be read without changing the current directory.
+    """
+    # longest suffix first, so a suffix can never shadow a longer one ending the same way
+    suffixes = sorted(((f'-{t}.csv', t) for t in dataset_types), key=lambda x: len(x[0]), reverse=True)
+    type_files = {t: {} for t in dataset_types}
+
+    for name in sorted(os.listdir(data_dir)):
+        folder = os.path.join(data_dir, name)
+        if not os.path.isdir(folder):
+            continue
+        for filename in sorted(os.listdir(folder)):
+            for suffix, dataset_type in suffixes:
+                if filename.endswith(suffix):
+                    # file names look like 'yyyy-mm-region-name-street.csv'
+                    region = '-'.join(filename[:-len(suffix)].split('-')[2:])
+                    type_files[dataset_type].setdefault(region, []).append(os.path.join(folder, filename))
+                    break
+
+    return type_files
+
 def drop_rows(dic,column):
     """
     Args:
@@ -88,16 +123,75 @@ def drop_rows(dic,column):
 
     Returns:
     The function drops the rows that have NaN value in the user column or columns.
-    This is performed for all the dataframes (values) in the dictionary.
+    This is performed for all the dataframes (values) in the dictionary, with a single pass over all the columns.
+    Columns that are not in a dataframe are reported and skipped, the other columns are still used.
     """
     for key, value in dic.items():
-        try:
-            for c in column:
-                value.dropna(subset= c, inplace=True)
-        except:
-            pass
+        missing = [c for c in column if c not in value.columns]
+        if missing:
+            print(f"Columns {missing} not found in {key}, they are not used to drop rows.")
+        value.dropna(subset=[c for c in column if c in value.columns], inplace=True)
     return dic
 
+def validate_rows(df, required=(), bounding_box=None, month_column=None):
+    """
+    Args:
+    df(pd.DataFrame): the dataframe to check.
+    required(list): columns that must not be NaN.
+    bounding_box(dict): column name: (lowest, highest) allowed values, e.g. UK_BOUNDING_BOX. NaN values are not checked.
+    month_column(str): column that must be in the 'YYYY-MM' format.
+
+    Returns:
+    A boolean array (True for the valid rows), and a dictionary with the number of rows rejected by each rule.
+    All the rules are combined into one mask, so the df is only filtered once. A row breaking several rules
+    is counted for each of them.
+    """
+    report = {}
+    valid = np.ones(len(df), dtype=bool)
+
+    missing = [c for c in required if c not in df.columns]
+    if missing:
+        print(f"Columns {missing} not found, they are not checked.")
+    present = [c for c in required if c in df.columns]
+    if present:
+        isna = df[present].isna().to_numpy()
+        for c, n in zip(present, isna.sum(axis=0)):
+            report[f'missing {c}'] = int(n)
+        valid = valid & ~isna.any(axis=1)
+
+    for c, (lowest, highest) in (bounding_box or {}).items():
+        if c not in df.columns:
+            continue
+        values = pd.to_numeric(df[c], errors='coerce').to_numpy(dtype='float64')
+        outside = df[c].notna().to_numpy() & ~((values >= lowest) & (values <= highest))
+        report[f'{c} outside {lowest} to {highest}'] = int(outside.sum())
+        valid = valid & ~outside
+
+    if month_column and month_column in df.columns:
+        bad_format = ~df[month_column].astype(str).str.fullmatch(r'\d{4}-(0[1-9]|1[0-2])').to_numpy(dtype=bool)
+        report[f'{month_column} not YYYY-MM'] = int(bad_format.sum())
+        valid = valid & ~bad_format
+
+    return valid, report
+
+def filter_valid_rows(df, required=(), bounding_box=None, month_column=None):
+    """
+    Args:
+    df(pd.DataFrame): the dataframe to filter.
+    required, bounding_box, month_column: the rules, see validate_rows.
+
+    Returns:
+    The df with only the valid rows, and a dictionary with the number of rows checked ('rows checked'),
+    rejected by each rule, and rejected in total ('rows rejected').
+    """
+    valid, rule_counts = validate_rows(df, required, bounding_box, month_column)
+    report = {'rows checked': len(df)}
+    report.update(rule_counts)
+    report['rows rejected'] = int((~valid).sum())
+    if valid.all():
+        return df, report
+    return df[valid], report
+
 def convert_y_m(df):
     """
     Converts a 'Month' column in the format 'YYYY-MM' into separate 'Date year' and 'Date month' columns,
@@ -187,14 +281,72 @@ def dic_apply_categorization(dic):
     return dic
 
 
-def read_pipeline_csv_to_dict(step):
+class LazyLayer(Mapping):
+    """
+    A read-only dictionary over the files of a pipeline layer folder, e.g. 'primary_dataframe'.
+    The keys are the file names, like the dictionary from read_pipeline_csv_to_dict, but a dataframe is only
+    read from its CSV when it is accessed. It is not kept afterwards, unless cache_bytes is set: the most
+    recently used dataframes are then cached, as long as their total memory stays under cache_bytes.
+    """
+
+    def __init__(self, step, cache_bytes=0):
+        """
+        Args:
+        step(str): Stage of the pipeline:'staged', 'primary'.
+        cache_bytes(int): memory budget (in bytes) of the cache of recently used dataframes, 0 to disable it.
+        """
+        # absolute, so the layer can still be read after the current directory changes
+        self.directory = os.path.abspath(f'{step}_dataframe')
+        self.cache_bytes = cache_bytes
+        self._files = sorted(os.listdir(self.directory))
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+
+    def path(self, key):
+        """
+        Returns:
+        The path of the CSV file of the key.
+        """
+        return os.path.join(self.directory, key)
+
+    def __getitem__(self, key):
+        if key not in self._files:
+            raise KeyError(key)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key][0]
+
+        df = pd.read_csv(self.path(key), index_col=0)
+        if self.cache_bytes:
+            size = int(df.memory_usage(deep=True).sum())
+            if size <= self.cache_bytes:
+                self._cache[key] = (df, size)
+                self._cached_bytes += size
+                # evict the least recently used dataframes
+                while self._cached_bytes > self.cache_bytes:
+                    _, (_, evicted_size) = self._cache.popitem(last=False)
+                    self._cached_bytes -= evicted_size
+        return df
+
+    def __iter__(self):
+        return iter(self._files)
+
+    def __len__(self):
+        return len(self._files)
+
+def read_pipeline_csv_to_dict(step, lazy=False, cache_bytes=0):
     """
     Args:
     step(str): Stage of the pipeline:'staged', 'primary'.
+    lazy(bool): return a LazyLayer, which only reads a region when it is used, instead of reading every region now.
+    cache_bytes(int): memory budget of the LazyLayer cache, see LazyLayer.
     
     Returns:
     A dictionary containing the region as the key, and the respetive dataframes as values.
     """
+    if lazy:
+        return LazyLayer(step, cache_bytes)
+
     os.chdir(f'{step}_dataframe/')
     staged_dict = {}
 
@@ -0,0 +1,56 @@
+import os
+import pytest
+
+from checkpoint import *
+
+def write_file(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+    return str(path)
+
+def test_input_signature_changes_with_inputs(tmp_path):
+    path = write_file(tmp_path / "input", "a")
+    signature = input_signature([path])
+    assert input_signature([path]) == signature
+    assert input_signature([path], extra={"option": 1}) != signature
+
+    write_file(path, "ab")
+    assert input_signature([path]) != signature
+    # a missing input is part of the signature
+    assert input_signature([path, str(tmp_path / "missing")]) != input_signature([path])
+
+def test_unit_key():
+    assert unit_key(("street", "kent")) == "street/kent"
+    assert unit_key("uk_postcode") == "uk_postcode"
+
+def test_record_and_check_unit(tmp_path):
+    checkpoint_dir = str(tmp_path / "checkpoints")
+    output = write_file(tmp_path / "output", "result")
+
+    assert load_checkpoints("staging", checkpoint_dir) == {}
+    record_unit_complete("staging", ("street", "kent"), "sig", [output], checkpoint_dir)
+    checkpoints = load_checkpoints("staging", checkpoint_dir)
+
+    assert unit_is_complete(checkpoints, ("street", "kent"), "sig")
+    assert not unit_is_complete(checkpoints, ("street", "kent"), "other sig")
+    assert not unit_is_complete(checkpoints, ("street", "avon"), "sig")
+
+    # the output checksum no longer matches
+    write_file(output, "changed")
+    assert not unit_is_complete(checkpoints, ("street", "kent"), "sig")
+
+    os.remove(output)
+    assert not unit_is_complete(checkpoints, ("street", "kent"), "sig")
+
+def test_pending_units(tmp_path):
+    checkpoint_dir = str(tmp_path / "checkpoints")
+    output = write_file(tmp_path / "output", "result")
+    record_unit_complete("reporting", "kent", "sig", [output], checkpoint_dir)
+
+    signatures = {"avon": "sig", "kent": "sig", "surrey": "sig"}
+    assert pending_units("reporting", signatures, checkpoint_dir=checkpoint_dir) == ["avon", "surrey"]
+    assert pending_units("reporting", signatures, resume=False, checkpoint_dir=checkpoint_dir) == ["avon", "kent", "surrey"]
+    assert pending_units("reporting", {"kent": "new sig"}, checkpoint_dir=checkpoint_dir) == ["kent"]
+
+    clear_checkpoints("reporting", checkpoint_dir)
+    assert pending_units("reporting", signatures, checkpoint_dir=checkpoint_dir) == ["avon", "kent", "surrey"]
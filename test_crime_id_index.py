@@ -0,0 +1,46 @@
+import pytest
+import numpy as np
+import pandas as pd
+
+from crime_id_index import *
+
+def test_hash_crime_ids_is_stable():
+    hashes = hash_crime_ids(["abc", "def", "abc"])
+    assert hashes.dtype == np.uint64
+    assert hashes[0] == hashes[2]
+    assert hashes[0] != hashes[1]
+
+def test_merge_and_lookup_crime_id_index():
+    index = merge_crime_id_index(empty_crime_id_index(), hash_crime_ids(["b", "a", "b"]))
+    assert len(index) == 2
+    assert (np.diff(index.astype("float64")) > 0).all()
+    assert in_crime_id_index(index, hash_crime_ids(["a", "c"])).tolist() == [True, False]
+    assert in_crime_id_index(empty_crime_id_index(), hash_crime_ids(["a"])).tolist() == [False]
+
+def test_save_and_load_crime_id_index(tmp_path):
+    path = str(tmp_path / "index" / "crime_ids.npy")
+    assert len(load_crime_id_index(path)) == 0
+
+    index = merge_crime_id_index(empty_crime_id_index(), hash_crime_ids(["a", "b"]))
+    save_crime_id_index(path, index)
+    assert (load_crime_id_index(path) == index).all()
+
+def test_deduplicate_crime_ids():
+    df = pd.DataFrame({"Crime ID": ["a", "b", "a", None, None, "c"], "Value": range(6)})
+    seen = merge_crime_id_index(empty_crime_id_index(), hash_crime_ids(["c"]))
+
+    result, hashes = deduplicate_crime_ids(df, seen=(seen,))
+
+    # the second 'a' is a duplicate, 'c' was seen before, rows without a Crime ID are kept
+    assert result["Value"].tolist() == [0, 1, 3, 4]
+    assert sorted(hashes.tolist()) == sorted(hash_crime_ids(["a", "b"]).tolist())
+
+def test_find_cross_region_duplicates():
+    region_indexes = {
+        "region1": merge_crime_id_index(empty_crime_id_index(), hash_crime_ids(["a", "b"])),
+        "region2": merge_crime_id_index(empty_crime_id_index(), hash_crime_ids(["b", "c", "d"])),
+    }
+    result = find_cross_region_duplicates(region_indexes)
+    assert result["Region"].tolist() == ["region1", "region2"]
+    assert result["Crime IDs"].tolist() == [2, 3]
+    assert result["Cross Force Duplicates"].tolist() == [1, 1]
@@ -0,0 +1,83 @@
+import pytest
+import pandas as pd
+
+from crime_trends import *
+
+@pytest.fixture
+def primary_df():
+    months = [(2022, m) for m in range(1, 13)] + [(2023, 1), (2023, 2)]
+    rows = []
+    for i, (year, month) in enumerate(months):
+        rows += [{"Date year": year, "Date month": month, "Crime type": "Burglary", "Location": "High St"}] * (i + 1)
+        rows += [{"Date year": year, "Date month": month, "Crime type": "Drugs", "Location": "Park"}] * 2
+    return pd.DataFrame(rows)
+
+def test_month_index_and_label():
+    index = month_index([2022, 2023], [12, 1])
+    assert index[1] - index[0] == 1
+    assert month_label(index) == ["2022-12", "2023-01"]
+
+def test_compute_crime_trends(primary_df):
+    state_df = count_crimes_by_month(primary_df)
+    result = compute_crime_trends(state_df, month_index([2023], [1]))
+
+    burglary = result[result["Crime type"] == "Burglary"].iloc[0]
+    assert burglary["Month"] == "2023-01"
+    assert burglary["Crime Count"] == 13
+    assert burglary["Rolling 3 Month"] == 11 + 12 + 13
+    assert burglary["Rolling 12 Month"] == sum(range(2, 14))
+    assert burglary["Same Month Last Year"] == 1
+    assert burglary["YoY Change"] == 12
+    assert burglary["Trend"] == "Rising"
+
+    drugs = result[result["Crime type"] == "Drugs"].iloc[0]
+    assert drugs["Trend"] == "Stable"
+    assert drugs["YoY Change %"] == 0
+
+def test_update_region_crime_trends_is_incremental(tmp_path, primary_df):
+    state_dir = str(tmp_path / "state")
+    report_dir = str(tmp_path)
+    history_df = primary_df[~((primary_df["Date year"] == 2023) & (primary_df["Date month"] == 2))]
+
+    assert len(update_region_crime_trends("region1", history_df, state_dir, report_dir)) == 13
+    # the next run only has to deal with the new month
+    assert update_region_crime_trends("region1", primary_df, state_dir, report_dir) == ["2023-02"]
+    assert update_region_crime_trends("region1", primary_df, state_dir, report_dir) == []
+
+    result = pd.read_csv(tmp_path / "reporting_region1_crime_trend_df", index_col=0)
+    expected = compute_crime_trends(count_crimes_by_month(primary_df), month_index(primary_df["Date year"],
+                                                                                   primary_df["Date month"]).tolist())
+    expected = expected.sort_values(["Month", "Crime type", "Location"], ignore_index=True)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+def test_update_region_crime_trends_recounts_restated_months(tmp_path, primary_df):
+    state_dir = str(tmp_path / "state")
+    report_dir = str(tmp_path)
+    update_region_crime_trends("region1", primary_df, state_dir, report_dir)
+
+    # 2022-06 is restated with one more burglary, 2023-02 is withdrawn
+    restated_df = pd.concat([primary_df, primary_df[(primary_df["Date year"] == 2022) & (primary_df["Date month"] == 6)].iloc[:1]])
+    restated_df = restated_df[~((restated_df["Date year"] == 2023) & (restated_df["Date month"] == 2))]
+    updated = update_region_crime_trends("region1", restated_df, state_dir, report_dir)
+    assert updated == month_label(range(month_index(2022, 6), month_index(2023, 1) + 1))
+
+    result = pd.read_csv(tmp_path / "reporting_region1_crime_trend_df", index_col=0)
+    expected = compute_crime_trends(count_crimes_by_month(restated_df), month_index(restated_df["Date year"],
+                                                                                    restated_df["Date month"]).tolist())
+    expected = expected.sort_values(["Month", "Crime type", "Location"], ignore_index=True)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+    assert update_region_crime_trends("region1", restated_df, state_dir, report_dir) == []
+
+def test_changed_months():
+    month_rows = count_rows_by_month(pd.DataFrame({"Date year": [2023] * 4, "Date month": [1, 1, 2, 3]}))
+    assert month_rows.to_dict() == {month_index(2023, 1): 2, month_index(2023, 2): 1, month_index(2023, 3): 1}
+    stored = pd.Series({month_index(2023, 1): 2, month_index(2023, 2): 2, month_index(2022, 12): 5})
+    assert changed_months(month_rows, stored).tolist() == month_index([2022, 2023, 2023], [12, 2, 3]).tolist()
+
+def test_region_trends_exist(tmp_path, primary_df):
+    state_dir = str(tmp_path / "state")
+    report_dir = str(tmp_path)
+    assert not region_trends_exist("region1", state_dir, report_dir)
+
+    update_region_crime_trends("region1", primary_df, state_dir, report_dir)
+    assert region_trends_exist("region1", state_dir, report_dir)
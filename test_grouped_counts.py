@@ -0,0 +1,48 @@
+import pytest
+import numpy as np
+import pandas as pd
+
+from grouped_counts import *
+
+def test_combine_codes():
+    combined, valid = combine_codes([np.array([0, 1, -1]), np.array([2, 0, 1])], (2, 3))
+    assert combined[valid].tolist() == [2, 3]
+    assert valid.tolist() == [True, True, False]
+
+@pytest.mark.parametrize("dense_min", [DENSE_MIN, 0])
+def test_grouped_counts(monkeypatch, dense_min):
+    # both the bincount and the sorting paths give the same groups
+    monkeypatch.setattr("grouped_counts.DENSE_MIN", dense_min)
+    monkeypatch.setattr("grouped_counts.DENSE_FACTOR", 4 if dense_min else 0)
+    codes = [np.array([1, 0, 1, 1, -1]), np.array([0, 2, 0, 1, 1])]
+    counted = np.array([True, True, False, True, True])
+
+    groups, sizes, counts = grouped_counts(codes, (2, 3), counted)
+
+    assert groups.tolist() == [2, 3, 4]
+    assert sizes.tolist() == [1, 2, 1]
+    assert counts.tolist() == [1, 1, 1]
+
+def test_encoded_region_codes_are_shared():
+    region = EncodedRegion(pd.DataFrame({"Crime type": ["b", "a", None, "b"]}))
+    codes, uniques = region.codes("Crime type")
+    assert codes.tolist() == [1, 0, -1, 1]
+    assert list(uniques) == ["a", "b"]
+    assert region.codes("Crime type")[0] is codes
+    assert encoded_region(region) is region
+
+def test_value_counts_matches_pandas():
+    df = pd.DataFrame({"Crime type": ["c", "a", "b", "a", None, "b", "d"]})
+    pd.testing.assert_series_equal(value_counts(EncodedRegion(df), "Crime type"), df["Crime type"].value_counts())
+
+def test_grouped_count_df_matches_pandas():
+    df = pd.DataFrame({"Date": ["2023-02", "2023-01", "2023-02", None, "2023-01"],
+                       "Crime type": ["a", "b", "a", "a", "a"],
+                       "Crime ID": ["1", None, "3", "4", "5"]})
+    region = EncodedRegion(df)
+
+    expected = df.groupby(["Date", "Crime type"])["Crime ID"].count().reset_index()
+    pd.testing.assert_frame_equal(grouped_count_df(region, ["Date", "Crime type"], "Crime ID", name="Crime ID"), expected)
+
+    expected = df.groupby(["Date", "Crime type"]).size().reset_index(name="size")
+    pd.testing.assert_frame_equal(grouped_count_df(region, ["Date", "Crime type"]), expected)
@@ -0,0 +1,180 @@
+import os
+import pytest
+import pandas as pd
+
+from pipeline import *
+
+STREET_COLUMNS = ['Crime ID', 'Month', 'Reported by', 'Falls within', 'Longitude', 'Latitude', 'Location',
+                  'LSOA code', 'LSOA name', 'Crime type', 'Last outcome category', 'Context']
+
+def write_street_month(month, crime_ids, location='On or near High St'):
+    os.makedirs(os.path.join('police_data', month), exist_ok=True)
+    rows = [[crime_id, month, 'kent', 'kent', 0.2141, 51.2285, location, 'E0100', 'LSOA A',
+             'Burglary', 'Under investigation', None] for crime_id in crime_ids]
+    pd.DataFrame(rows, columns=STREET_COLUMNS).to_csv(os.path.join('police_data', month, f'{month}-kent-street.csv'), index=False)
+
+@pytest.fixture
+def pipeline_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('uk_postcode')
+    pd.DataFrame({'id': [0], 'postcode': ['ME1 1AA'], 'latitude': [51.2285], 'longitude': [0.2141]}).to_csv(
+        os.path.join('uk_postcode', 'ukpostcodes.csv'), index=False)
+    return tmp_path
+
+def test_staging_appends_new_months_for_primary(pipeline_dir):
+    index_path = os.path.join('crime_id_index', 'staged_ids.npy')
+    write_street_month('2023-01', ['a', 'b', 'c'])
+    staging(crime_id_index_path=index_path)
+
+    # the next month repeats 'c', only the new crimes are appended
+    write_street_month('2023-04', ['c', 'd', 'e'])
+    staging(crime_id_index_path=index_path)
+
+    staged_df = pd.read_csv(os.path.join('staged_dataframe', 'staged_kent_df'), index_col=0)
+    assert staged_df['Crime ID'].tolist() == ['a', 'b', 'c', 'd', 'e']
+    assert staged_df.index.is_unique
+
+    primary(apply_outcomes=False)
+    primary_df = pd.read_csv(os.path.join('primary_dataframe', 'primary_kent_df'), index_col=0)
+    assert len(primary_df) == 5
+    assert primary_df['Date month'].tolist() == [1, 1, 1, 4, 4]
+
+def test_staging_index_skips_regions_not_written(pipeline_dir):
+    index_path = os.path.join('crime_id_index', 'staged_ids.npy')
+    write_street_month('2023-01', ['a', 'b'])
+    # the staged file cannot be written
+    os.makedirs(os.path.join('staged_dataframe', 'staged_kent_df'))
+    staging(crime_id_index_path=index_path)
+    assert len(load_crime_id_index(index_path)) == 0
+
+    os.rmdir(os.path.join('staged_dataframe', 'staged_kent_df'))
+    staging(crime_id_index_path=index_path)
+    staged_df = pd.read_csv(os.path.join('staged_dataframe', 'staged_kent_df'), index_col=0)
+    assert staged_df['Crime ID'].tolist() == ['a', 'b']
+    assert len(load_crime_id_index(index_path)) == 2
+
+def write_outcomes_month(month, outcomes):
+    os.makedirs(os.path.join('police_data', month), exist_ok=True)
+    pd.DataFrame({'Crime ID': list(outcomes), 'Month': month, 'Reported by': 'kent', 'Falls within': 'kent',
+                  'Longitude': 0.2141, 'Latitude': 51.2285, 'Location': 'On or near High St', 'LSOA code': 'E0100',
+                  'LSOA name': 'LSOA A', 'Outcome type': list(outcomes.values())}).to_csv(
+        os.path.join('police_data', month, f'{month}-kent-outcomes.csv'), index=False)
+
+def read_street_outputs():
+    paths = [os.path.join('primary_dataframe', 'primary_kent_df'), os.path.join('post_code_street', 'post_code_staged_kent_df')]
+    for root, _, files in os.walk(os.path.join(PRIMARY_PARTITION_DIR, 'kent')):
+        paths += [os.path.join(root, f) for f in files if not f.endswith('.npz')]
+    outputs = {}
+    for path in sorted(paths):
+        with open(path) as f:
+            outputs[path] = f.read()
+    return outputs
+
+def test_primary_applies_changed_outcomes_only(pipeline_dir, monkeypatch):
+    write_street_month('2023-01', ['a', 'b', 'c'])
+    write_street_month('2023-02', ['d'])
+    write_outcomes_month('2023-01', {'a': 'Local resolution'})
+    staging()
+    primary()
+    primary_df = pd.read_csv(os.path.join('primary_dataframe', 'primary_kent_df'), index_col=0)
+    assert primary_df['Last outcome category'].tolist() == ['Local resolution'] + ['Under investigation'] * 3
+
+    write_outcomes_month('2023-02', {'b': 'Offender given a caution'})
+    staging()
+    # the staged street data is not transformed again, and the partition of 2023-02 doesn't hold 'b'
+    transformed = []
+    def spy_transform(dataset_type, df):
+        transformed.append(dataset_type)
+        return transform_primary_dataset(dataset_type, df)
+    monkeypatch.setattr('pipeline.transform_primary_dataset', spy_transform)
+    untouched_partition = os.path.join(PRIMARY_PARTITION_DIR, 'kent', '2023-02', 'burglary')
+    untouched_mtime = os.stat(untouched_partition).st_mtime_ns
+    primary()
+    assert transformed == ['outcomes']
+    assert os.stat(untouched_partition).st_mtime_ns == untouched_mtime
+
+    primary_df = pd.read_csv(os.path.join('primary_dataframe', 'primary_kent_df'), index_col=0)
+    assert primary_df['Last outcome category'].tolist()[:2] == ['Local resolution', 'Offender given a caution']
+    assert primary_df['Broad Outcome Category'].tolist()[1] == categorize_outcome('Offender given a caution')
+
+    # the updated outputs are the same as a full rebuild
+    updated_outputs = read_street_outputs()
+    primary(resume=False)
+    assert read_street_outputs() == updated_outputs
+
+def test_primary_redoes_postcode_merge_when_postcodes_change(pipeline_dir):
+    write_street_month('2023-01', ['a'])
+    staging()
+    primary(apply_outcomes=False)
+    post_code_path = os.path.join('post_code_street', 'post_code_staged_kent_df')
+    assert pd.read_csv(post_code_path)['Postcode'].tolist() == ['ME1 1AA']
+
+    pd.DataFrame({'id': [0], 'postcode': ['ME2 2BB'], 'latitude': [51.2285], 'longitude': [0.2141]}).to_csv(
+        os.path.join('uk_postcode', 'ukpostcodes.csv'), index=False)
+    staging()
+    primary(apply_outcomes=False)
+    assert pd.read_csv(post_code_path)['Postcode'].tolist() == ['ME2 2BB']
+
+def write_stop_and_search_month(month, n_searches):
+    pd.DataFrame({'Type': 'Person search', 'Date': [f'{month}-0{i + 1}T10:30:00+00:00' for i in range(n_searches)],
+                  'Latitude': 51.2285, 'Longitude': 0.2141, 'Object of search': 'Controlled drugs'}).to_csv(
+        os.path.join('police_data', month, f'{month}-kent-stop-and-search.csv'), index=False)
+
+def test_staging_appends_every_dataset_type_with_an_index(pipeline_dir):
+    index_path = os.path.join('crime_id_index', 'staged_ids.npy')
+    for month, crime_ids in [('2023-01', ['a']), ('2023-02', ['b']), ('2023-03', ['c'])]:
+        write_street_month(month, crime_ids)
+        write_outcomes_month(month, {crime_ids[0]: 'Local resolution'})
+        write_stop_and_search_month(month, 2)
+    staging(crime_id_index_path=index_path, end_month='2023-02')
+    staging(crime_id_index_path=index_path, start_month='2023-03')
+    # the last month staged again is not appended twice
+    staging(crime_id_index_path=index_path, start_month='2023-03')
+
+    for dataset_type, expected in [('street', ['a', 'b', 'c']), ('outcomes', ['a', 'b', 'c'])]:
+        staged_df = pd.read_csv(os.path.join(layer_dir('staged', dataset_type), 'staged_kent_df'), index_col=0)
+        assert staged_df['Crime ID'].tolist() == expected
+        assert staged_df.index.is_unique
+    staged_df = pd.read_csv(os.path.join(layer_dir('staged', 'stop-and-search'), 'staged_kent_df'), index_col=0)
+    assert staged_df['Date'].str[:7].tolist() == ['2023-01', '2023-01', '2023-02', '2023-02', '2023-03', '2023-03']
+    assert staged_df.index.tolist() == list(range(6))
+
+    primary()
+    for dataset_type, rows in [('street', 3), ('outcomes', 3), ('stop-and-search', 6)]:
+        assert len(pd.read_csv(os.path.join(layer_dir('primary', dataset_type), 'primary_kent_df'), index_col=0)) == rows
+
+def test_staging_does_not_checkpoint_regions_with_unreadable_files(pipeline_dir):
+    write_street_month('2023-01', ['a'])
+    # the file of 2023-02 cannot be read
+    os.makedirs(os.path.join('police_data', '2023-02', '2023-02-kent-street.csv'))
+    staging()
+    assert 'street/kent' not in load_checkpoints('staging')
+    assert not os.path.exists(os.path.join('staged_dataframe', 'staged_kent_df'))
+
+    os.rmdir(os.path.join('police_data', '2023-02', '2023-02-kent-street.csv'))
+    write_street_month('2023-02', ['b'])
+    staging()
+    staged_df = pd.read_csv(os.path.join('staged_dataframe', 'staged_kent_df'), index_col=0)
+    assert staged_df['Crime ID'].tolist() == ['a', 'b']
+
+def test_reporting_reports_again_when_the_report_code_changes(pipeline_dir, monkeypatch):
+    write_street_month('2023-01', ['a'])
+    # the location reports leave out the crimes without a location
+    write_street_month('2023-02', ['b'], location='On or near')
+    staging()
+    primary()
+    reported = []
+    def spy_reports(df, engine):
+        reported.append(len(df))
+        return create_region_reports(df, engine)
+    monkeypatch.setattr('pipeline.create_region_reports', spy_reports)
+
+    reporting()
+    reporting()
+    assert reported == [2]
+
+    def new_report(df):
+        return df
+    monkeypatch.setattr('pipeline.REPORT_FUNCTIONS', REPORT_FUNCTIONS + [new_report])
+    reporting()
+    assert reported == [2, 2]
@@ -0,0 +1,118 @@
+import pytest
+import numpy as np
+import pandas as pd
+
+from police_datasets import *
+
+@pytest.fixture
+def street_df():
+    return pd.DataFrame({
+        "Crime ID": ["a", "b", "c"],
+        "Last outcome category": ["Under investigation", "Under investigation", "Local resolution"],
+        "Broad Outcome Category": ["Under investigation", "Under investigation", "Non-criminal Outcome"]
+    })
+
+@pytest.fixture
+def outcomes_df():
+    return pd.DataFrame({
+        "Crime ID": ["a", "a", "c", "z", np.nan],
+        "Date": ["2023-02-01", "2023-01-01", "2023-03-01", "2023-01-01", "2023-01-01"],
+        "Outcome type": ["Unable to prosecute suspect", "Under investigation", "Local resolution",
+                         "Offender given a caution", "Local resolution"]
+    })
+
+@pytest.mark.parametrize("step, dataset_type, expected", [
+    ("staged", "street", "staged_dataframe"),
+    ("primary", "outcomes", "primary_outcomes_dataframe"),
+    ("staged", "stop-and-search", "staged_stop-and-search_dataframe")
+])
+def test_layer_dir(step, dataset_type, expected):
+    assert layer_dir(step, dataset_type) == expected
+
+def test_clean_staged_dataset_outcomes():
+    df = pd.DataFrame({
+        "Crime ID": ["a", "a", None],
+        "Month": ["2023-01", "2023-01", "2023-01"],
+        "Outcome type": ["Local resolution", "Local resolution", "Local resolution"]
+    })
+    result = clean_staged_dataset("outcomes", df)
+    assert result["Crime ID"].tolist() == ["a"]
+
+def test_transform_primary_dataset_stop_and_search():
+    df = pd.DataFrame({"Date": ["2023-08-01T10:30:00+01:00", "2023-09-30T23:30:00+00:00"]})
+    result = transform_primary_dataset("stop-and-search", df)
+    assert result["Date year"].tolist() == ["2023", "2023"]
+    assert result["Date month"].tolist() == ["08", "09"]
+    assert result["Date"].iloc[0].hour == 9  # converted to UTC
+
+def test_transform_primary_dataset_outcomes():
+    df = pd.DataFrame({"Month": ["2023-08"], "Location": ["On or near"], "Outcome type": ["Local resolution"]})
+    result = transform_primary_dataset("outcomes", df)
+    assert result["Broad Outcome Category"].tolist() == ["Non-criminal Outcome"]
+    assert result["Location"].tolist() == ["No Info"]
+
+def test_latest_outcomes(outcomes_df):
+    result = latest_outcomes(outcomes_df)
+    assert result["a"] == "Unable to prosecute suspect"
+    assert result.index.is_unique
+    assert len(result) == 3
+
+def test_apply_outcomes_to_street(street_df, outcomes_df):
+    updated = apply_outcomes_to_street(street_df, latest_outcomes(outcomes_df))
+
+    assert updated == 1  # 'c' already had its latest outcome, 'b' has none
+    assert street_df["Last outcome category"].tolist() == ["Unable to prosecute suspect", "Under investigation",
+                                                           "Local resolution"]
+    assert street_df["Broad Outcome Category"].iloc[0] == "No Further Action"
+
+def test_read_region_outcome_index(tmp_path, outcomes_df):
+    outcomes_df.assign(Extra=1).to_csv(tmp_path / "primary_region1_df")
+
+    assert read_region_outcome_index("region1", str(tmp_path))["c"] == "Local resolution"
+    assert read_region_outcome_index("region2", str(tmp_path)) is None
+
+def test_read_and_clean_region_deduplicates_across_files(tmp_path):
+    paths = []
+    for i, crime_ids in enumerate([["a", "b"], ["b", "c"]]):
+        path = tmp_path / f"file{i}.csv"
+        pd.DataFrame({"Crime ID": crime_ids, "Longitude": 0.1, "Latitude": 51.5, "Context": np.nan,
+                      "Last outcome category": "Local resolution", "LSOA code": "E01", "LSOA name": "A"}).to_csv(path, index=False)
+        paths.append(str(path))
+    seen = merge_crime_id_index(empty_crime_id_index(), hash_crime_ids(["c"]))
+
+    result, crime_ids = read_and_clean_region("street", paths, seen_crime_ids=(seen,))
+
+    assert result["Crime ID"].tolist() == ["a", "b"]
+    assert "Context" not in result.columns
+    assert len(crime_ids) == 2
+
+def test_changed_outcomes(tmp_path, outcomes_df):
+    outcome_index = latest_outcomes(outcomes_df)
+    assert read_applied_outcomes("region1", str(tmp_path)).empty
+    assert changed_outcomes(outcome_index, read_applied_outcomes("region1", str(tmp_path))).equals(outcome_index)
+
+    save_applied_outcomes("region1", outcome_index, str(tmp_path))
+    applied = read_applied_outcomes("region1", str(tmp_path))
+    assert changed_outcomes(outcome_index, applied).empty
+
+    # 'a' has a new outcome and 'y' is a new crime, 'c' and 'z' are unchanged
+    outcome_index = pd.concat([outcome_index.drop("a"), pd.Series({"a": "Local resolution", "y": "Awaiting court outcome"})])
+    assert changed_outcomes(outcome_index, applied).to_dict() == {"a": "Local resolution", "y": "Awaiting court outcome"}
+
+def test_read_and_clean_region_unreadable_file(tmp_path):
+    missing = str(tmp_path / "missing.csv")
+    result, _ = read_and_clean_region("street", [missing])
+    assert result.empty
+    with pytest.raises(FileNotFoundError):
+        read_and_clean_region("street", [missing], skip_unreadable=False)
+
+def test_apply_outcomes_to_file(tmp_path, street_df, outcomes_df):
+    path = str(tmp_path / "primary_region1_df")
+    street_df.assign(Longitude=[0.1, np.nan, 0.25]).to_csv(path)
+
+    assert apply_outcomes_to_file(path, latest_outcomes(outcomes_df), chunksize=2) == 1
+    expected_df = street_df.assign(Longitude=[0.1, np.nan, 0.25])
+    apply_outcomes_to_street(expected_df, latest_outcomes(outcomes_df))
+    with open(path) as f:
+        assert f.read() == expected_df.to_csv()
+    assert apply_outcomes_to_file(path, latest_outcomes(outcomes_df)) == 0
@@ -0,0 +1,63 @@
+import pytest
+import numpy as np
+import pandas as pd
+
+from postcode_store import build_postcode_store, load_postcode_store
+from postcode_lookup import *
+
+@pytest.fixture
+def store(tmp_path):
+    uk_post_df = pd.DataFrame({
+        "Postcode": ["SW1A 1AA", "SW1A 2AA", "SW1 1AB", "E1 6AN", "AB10 1XG"],
+        "Latitude": [51.501009, 51.503540, 51.497000, 51.520300, 57.144165],
+        "Longitude": [-0.141588, -0.127695, -0.135000, -0.072700, -2.114848]
+    })
+    return load_postcode_store(build_postcode_store(uk_post_df, str(tmp_path)))
+
+@pytest.mark.parametrize("postcode, expected", [
+    ("sw1a1aa", "SW1A 1AA"),
+    (" SW1A  1AA ", "SW1A 1AA"),
+    ("e16an", "E1 6AN"),
+    (None, "")
+])
+def test_normalise_postcodes(postcode, expected):
+    assert normalise_postcodes([postcode])[0] == expected
+
+def test_postcode_outcode_and_sector():
+    assert postcode_outcode(["sw1a1aa", "E1 6AN"]).tolist() == ["SW1A", "E1"]
+    assert postcode_sector(["sw1a1aa", "E1 6AN"]).tolist() == ["SW1A 1", "E1 6"]
+
+def test_lookup_postcode_coordinates(store):
+    result = lookup_postcode_coordinates(store, ["sw1a 2aa", "E16AN", "ZZ1 1ZZ"])
+    assert result["Postcode"].tolist() == ["SW1A 2AA", "E1 6AN", "ZZ1 1ZZ"]
+    assert result["Latitude"].iloc[0] == 51.503540
+    assert result["Longitude"].iloc[1] == -0.072700
+    assert np.isnan(result["Latitude"].iloc[2])
+
+def test_lookup_postcode_prefix(store):
+    assert lookup_postcode_prefix(store, "SW1A")["Postcode"].tolist() == ["SW1A 1AA", "SW1A 2AA"]
+    assert lookup_postcode_prefix(store, "sw1")["Postcode"].tolist() == ["SW1 1AB"]
+    assert lookup_postcode_prefix(store, "SW1A 2")["Postcode"].tolist() == ["SW1A 2AA"]
+    assert lookup_postcode_prefix(store, "N1").empty
+
+def test_nearest_postcodes(store):
+    result = nearest_postcodes(store, [51.5011, 51.5202, 57.1440, np.nan], [-0.1415, -0.0730, -2.1150, 0.0])
+    assert result["Postcode"].tolist()[:3] == ["SW1A 1AA", "E1 6AN", "AB10 1XG"]
+    assert result["Sector"].tolist()[:3] == ["SW1A 1", "E1 6", "AB10 1"]
+    assert result["Distance (m)"].iloc[0] < 20
+    assert pd.isna(result["Postcode"].iloc[3])
+
+def test_nearest_postcodes_matches_brute_force(store):
+    rng = np.random.default_rng(0)
+    latitude = rng.uniform(51.49, 51.53, 50)
+    longitude = rng.uniform(-0.15, -0.07, 50)
+
+    result = nearest_postcodes(store, latitude, longitude, max_rings=100)
+
+    candidates = lookup_postcode_prefix(store, "SW1A").pipe(
+        lambda df: pd.concat([df, lookup_postcode_prefix(store, "SW1"), lookup_postcode_prefix(store, "E1")]))
+    for i in range(len(latitude)):
+        dx = np.radians(candidates["Longitude"] - longitude[i]) * np.cos(np.radians(latitude[i]))
+        dy = np.radians(candidates["Latitude"] - latitude[i])
+        distance = EARTH_RADIUS_M * np.hypot(dx, dy)
+        assert result["Postcode"].iloc[i] == candidates["Postcode"].iloc[np.argmin(distance)]
@@ -0,0 +1,105 @@
+import os
+import pytest
+import numpy as np
+import pandas as pd
+
+from postcode_store import *
+
+@pytest.fixture
+def uk_post_df():
+    return pd.DataFrame({
+        "Postcode": ["SW1A 1AA", "AB10 1XG", "ZE3 9JZ", "AB10 6RN"],
+        "Latitude": [51.501009, 57.144165, 59.870216, 57.144201],  # the two AB10 postcodes share a 3.d.p bucket
+        "Longitude": [-0.141588, -2.114848, -1.291456, -2.114851]
+    })
+
+@pytest.fixture
+def store(tmp_path, uk_post_df):
+    return load_postcode_store(build_postcode_store(uk_post_df, str(tmp_path)))
+
+def test_build_postcode_store_sorts_postcodes(store):
+    assert store["postcode"].astype(str).tolist() == ["AB10 1XG", "AB10 6RN", "SW1A 1AA", "ZE3 9JZ"]
+    latitude, longitude = store_coordinates(store, np.array([2]))
+    assert latitude[0] == 51.501009
+    assert longitude[0] == -0.141588
+
+def test_load_postcode_store_is_memory_mapped(store):
+    for array in store.values():
+        assert isinstance(array, np.memmap)
+        assert not array.flags.writeable
+
+def test_coordinate_cell_keys_match_rounding():
+    latitude = np.array([51.5004, 51.5006, 51.5014, np.nan])
+    longitude = np.array([-0.1414, -0.1414, -0.1414, -0.1414])
+    keys = coordinate_cell_keys(latitude, longitude)
+    assert keys[0] != keys[1]
+    assert keys[1] == keys[2]  # both round to 51.501
+    assert keys[3] == -1
+
+def test_cell_representatives_match_pandas_merge(store, uk_post_df):
+    street_df = pd.DataFrame({"Latitude": [57.1442, 51.5011, 52.0, np.nan],
+                              "Longitude": [-2.1149, -0.1418, 0.0, 0.0]})
+
+    positions = cell_representatives(store, street_df["Latitude"], street_df["Longitude"])
+    result = [store["postcode"][p].decode() if p >= 0 else None for p in positions]
+
+    # the previous implementation: round both sides, keep the first postcode per bucket, then merge
+    rounded = uk_post_df.assign(lat=uk_post_df["Latitude"].round(3), lon=uk_post_df["Longitude"].round(3))
+    rounded = rounded.drop_duplicates(subset=["lat", "lon"])
+    merged = street_df.assign(lat=street_df["Latitude"].round(3), lon=street_df["Longitude"].round(3)).merge(
+        rounded[["lat", "lon", "Postcode"]], how="left", on=["lat", "lon"])
+    expected = [p if isinstance(p, str) else None for p in merged["Postcode"]]
+
+    assert result == expected
+    assert result[0] == "AB10 1XG"
+
+def test_rebuild_keeps_the_mapped_store(tmp_path, uk_post_df):
+    store_dir = str(tmp_path / "store")
+    store = load_postcode_store(build_postcode_store(uk_post_df, store_dir))
+    postcodes = store["postcode"].copy()
+
+    new_store = load_postcode_store(build_postcode_store(uk_post_df.iloc[:2], store_dir))
+    # the arrays mapped before the rebuild still read the earlier store
+    assert (store["postcode"] == postcodes).all()
+    assert len(new_store["postcode"]) == 2
+    assert sorted(os.listdir(tmp_path)) == ["store"]
+
+def test_store_is_checked_against_its_info(tmp_path, uk_post_df):
+    store_dir = str(tmp_path / "store")
+    build_postcode_store(uk_post_df, store_dir)
+    assert postcode_store_exists(store_dir)
+
+    # an array from another build
+    np.save(os.path.join(store_dir, "cell_order.npy"), np.arange(2, dtype="int32"))
+    assert not postcode_store_exists(store_dir)
+    with pytest.raises(ValueError):
+        load_postcode_store(store_dir)
+
+    os.remove(os.path.join(store_dir, STORE_INFO_FILE))
+    assert not postcode_store_exists(store_dir)
+
+def test_merge_coordinate_df_builds_the_store_once(tmp_path, monkeypatch, uk_post_df):
+    import threading
+    import time
+    import postcode_and_price_cleaning
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "uk_postcode").mkdir()
+    uk_post_df.to_csv(tmp_path / "uk_postcode" / "cleaned_ukpostcodes")
+    builds = []
+    def slow_build(df):
+        builds.append(len(df))
+        time.sleep(0.05)  # the other threads reach the store check while it is being built
+        return build_postcode_store(df)
+    monkeypatch.setattr(postcode_and_price_cleaning, "build_postcode_store", slow_build)
+
+    street_df = pd.DataFrame({"Crime ID": ["a"], "Latitude": [57.144165], "Longitude": [-2.114848]})
+    threads = [threading.Thread(target=postcode_and_price_cleaning.merge_coordinate_df,
+                                args=(f"staged_region{i}_df", street_df.copy())) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert builds == [4]
+    assert len(list((tmp_path / "post_code_street").iterdir())) == 4
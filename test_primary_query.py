@@ -0,0 +1,86 @@
+import os
+import pytest
+import pandas as pd
+
+from primary_query import *
+
+@pytest.fixture
+def partition_dir(tmp_path):
+    region1_df = pd.DataFrame({
+        "Crime ID": ["a", "b", "c", "d"],
+        "Date year": [2023, 2023, 2023, 2024],
+        "Date month": [1, 1, 2, 1],
+        "Crime type": ["Burglary", "Drugs", "Drugs", "Burglary"],
+        "Last outcome category": ["Local resolution", "Under investigation", "Local resolution", "Under investigation"],
+        "Broad Outcome Category": ["Non-criminal Outcome", "Under investigation", "Non-criminal Outcome",
+                                   "Under investigation"]
+    })
+    region2_df = region1_df.assign(**{"Crime ID": ["e", "f", "g", "h"]})
+    write_primary_partitions("region1", region1_df, str(tmp_path))
+    write_primary_partitions("region2", region2_df, str(tmp_path))
+    return str(tmp_path)
+
+def test_write_primary_partitions(partition_dir):
+    manifest_df = read_partition_manifest("region1", partition_dir)
+    assert manifest_df["Month"].tolist() == ["2023-01", "2023-01", "2023-02", "2024-01"]
+    assert manifest_df["Crime type"].tolist() == ["Burglary", "Drugs", "Drugs", "Burglary"]
+    assert manifest_df["File"].iloc[0] == os.path.join("2023-01", "burglary")
+    assert manifest_df["Rows"].tolist() == [1, 1, 1, 1]
+
+def test_crime_type_file():
+    assert crime_type_file("Violence and sexual offences") == "violence-and-sexual-offences"
+    assert crime_type_file("") == NO_CRIME_TYPE_FILE
+
+@pytest.mark.parametrize("filters, expected", [
+    ({"regions": ["region1"]}, 4),
+    ({"start": "2023-02", "end": "2023-12"}, 2),
+    ({"crime_types": ["Burglary"]}, 4),  # the drugs crimes of 2023-01 are in their own partitions
+    ({"regions": ["region2"], "outcomes": ["Non-criminal Outcome"]}, 2)
+])
+def test_select_partitions(partition_dir, filters, expected):
+    assert len(select_partitions(partition_dir=partition_dir, **filters)) == expected
+
+def test_query_primary(partition_dir):
+    result = query_primary(regions=["region1"], start="2023-01", end="2023-12", crime_types=["Burglary"],
+                           partition_dir=partition_dir)
+    assert result["Crime ID"].tolist() == ["a"]
+    assert result["Region"].tolist() == ["region1"]
+
+def test_query_primary_columns_and_outcomes(partition_dir):
+    result = query_primary(outcomes=["Local resolution"], columns=["Crime ID"], partition_dir=partition_dir)
+    assert list(result.columns) == ["Crime ID", "Region"]
+    assert sorted(result["Crime ID"]) == ["a", "c", "e", "g"]
+
+def test_iter_query_primary_yields_per_partition(partition_dir):
+    frames = list(iter_query_primary(regions=["region2"], partition_dir=partition_dir))
+    assert [len(df) for df in frames] == [1, 1, 1, 1]
+
+def test_query_primary_without_partitions(tmp_path):
+    assert query_primary(partition_dir=str(tmp_path / "missing")).empty
+
+def test_partitions_with_crimes(partition_dir):
+    assert partitions_with_crimes("region1", ["b", "d", "e"], partition_dir).tolist() == [1, 3]
+    assert partitions_with_crimes("region1", ["z"], partition_dir).tolist() == []
+
+def test_update_partitions(partition_dir):
+    def close_drugs_cases(df):
+        changed = df["Crime type"] == "Drugs"
+        df.loc[changed, "Last outcome category"] = "Court result unavailable"
+        return int(changed.sum())
+
+    # only the partitions of 'a' and 'b' are read, the one of 'a' (burglary) is not changed
+    assert update_partitions("region1", ["a", "b"], close_drugs_cases, partition_dir) == 1
+    assert query_primary(["region1"], crime_types=["Drugs"], partition_dir=partition_dir)[
+        "Last outcome category"].tolist() == ["Court result unavailable", "Local resolution"]
+    manifest_df = read_partition_manifest("region1", partition_dir)
+    assert manifest_df["Outcomes"].iloc[1] == "Court result unavailable|Under investigation"
+
+def test_failed_write_keeps_the_earlier_partitions(partition_dir):
+    with pytest.raises(KeyError):
+        write_primary_partitions("region1", pd.DataFrame({"Date year": [2023], "Date month": [3]}), partition_dir)
+    assert len(select_partitions(["region1"], partition_dir=partition_dir)) == 4
+    assert sorted(os.listdir(partition_dir)) == ["region1", "region2"]
+
+def test_select_partitions_skips_regions_without_manifest(partition_dir):
+    os.remove(os.path.join(partition_dir, "region2", MANIFEST_FILE))
+    assert {region for region, _, _ in select_partitions(partition_dir=partition_dir)} == {"region1"}
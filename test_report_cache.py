@@ -0,0 +1,89 @@
+import os
+import pickle
+import pytest
+import pandas as pd
+
+from report_cache import *
+
+def report_function(df):
+    return df
+
+def write_file(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+    return str(path)
+
+def test_report_parameters():
+    params = report_parameters([report_function], zooms=[10])
+    assert params["reports"] == ["report_function"]
+    assert len(params["code"]) == 1
+    assert params["options"] == {"zooms": [10]}
+
+    # the code of the modules the reports use is checksummed too
+    assert len(report_parameters([report_function], modules=[pickle])["code"]) == 2
+    assert report_parameters([report_function], modules=[pickle])["options"] == {}
+
+def test_fingerprint_follows_content_and_parameters(tmp_path):
+    cache = ReportCache(str(tmp_path / "cache"))
+    path = write_file(tmp_path / "primary_region_df", "a,b\n1,2\n")
+
+    key = cache.fingerprint(path, {"reports": ["r"]})
+    assert cache.fingerprint(path, {"reports": ["r"]}) == key
+    assert cache.fingerprint(path, {"reports": ["other"]}) != key
+
+    # the same content written again has the same fingerprint
+    write_file(path, "a,b\n1,2\n")
+    assert cache.fingerprint(path, {"reports": ["r"]}) == key
+
+    write_file(path, "a,b\n1,3\n")
+    assert cache.fingerprint(path, {"reports": ["r"]}) != key
+
+def test_get_and_put(tmp_path):
+    cache = ReportCache(str(tmp_path / "cache"))
+    reports = {"report_df": pd.DataFrame({"Crime Count": [1, 2]})}
+
+    assert cache.get("key") is None
+    cache.put("key", reports)
+    pd.testing.assert_frame_equal(cache.get("key")["report_df"], reports["report_df"])
+
+    # the entries are kept on disk
+    assert ReportCache(str(tmp_path / "cache")).get("key") is not None
+
+    cache.clear()
+    assert cache.get("key") is None
+
+@pytest.mark.parametrize("content", [
+    b"not a pickle",
+    b"cmissing_module\nReports\n.",  # a class that can no longer be imported
+    pickle.dumps({"report_df": pd.DataFrame({"a": range(100)})})[:200],  # truncated
+])
+def test_damaged_entry_is_a_miss(tmp_path, content):
+    cache = ReportCache(str(tmp_path / "cache"))
+    cache.put("key", {"report_df": pd.DataFrame()})
+    with open(tmp_path / "cache" / "key.pkl", "wb") as f:
+        f.write(content)
+    assert cache.get("key") is None
+    assert not os.path.exists(tmp_path / "cache" / "key.pkl")
+
+def test_least_recently_used_entries_are_evicted(tmp_path, mocker):
+    clock = mocker.patch("report_cache.time.time")
+    cache = ReportCache(str(tmp_path / "cache"))
+    report = {"report_df": pd.DataFrame({"Value": range(1000)})}
+
+    clock.return_value = 1
+    cache.put("first", report)
+    entry_bytes = cache.size_bytes()
+    cache.max_bytes = 2 * entry_bytes
+
+    clock.return_value = 2
+    cache.put("second", report)
+    clock.return_value = 3
+    cache.get("first")
+    clock.return_value = 4
+    cache.put("third", report)
+
+    # 'second' was used the longest time ago
+    assert cache.get("second") is None
+    assert cache.get("first") is not None
+    assert cache.get("third") is not None
+    assert cache.size_bytes() <= cache.max_bytes
@@ -0,0 +1,79 @@
+import os
+import json
+import subprocess
+import sys
+import pytest
+
+from run_pipeline import *
+
+def test_parse_config_defaults():
+    config = parse_config([])
+    assert config["start"] == "staging"
+    assert config["goal"] == "all"
+    assert config["resume"] is True
+    assert (config["shard_index"], config["shard_count"]) == (0, 1)
+
+def test_parse_config_file_and_command_line(tmp_path):
+    path = tmp_path / "run.json"
+    path.write_text(json.dumps({"workers": 8, "regions": ["kent"], "goal": "primary"}))
+
+    config = parse_config(["--config", str(path), "--workers", "4", "--shard", "1/3", "--no-resume"])
+
+    # the command line overrides the config file, which overrides the defaults
+    assert config["workers"] == 4
+    assert config["regions"] == ["kent"]
+    assert config["goal"] == "primary"
+    assert (config["shard_index"], config["shard_count"]) == (1, 3)
+    assert config["resume"] is False
+    assert config["queue_size"] == DEFAULT_CONFIG["queue_size"]
+
+@pytest.mark.parametrize("argv", [
+    ["--start", "reporting", "--goal", "primary"],
+    ["--start-month", "2023-1"],
+    ["--shard", "2/2"],
+    ["--shard", "two"],
+    ["--workers", "0"],
+    ["--shard", "0/2", "--crime-id-index", "ids.npy"],
+    ["--memory-limit-mb", "2000"],  # removed, reporting reads each region once
+])
+def test_parse_config_rejects_invalid_options(argv):
+    with pytest.raises(SystemExit):
+        parse_config(argv)
+
+def test_load_config_file_rejects_unknown_options(tmp_path):
+    path = tmp_path / "run.json"
+    path.write_text(json.dumps({"worker": 8}))
+    with pytest.raises(ValueError):
+        load_config_file(str(path))
+
+def test_region_shards_split_the_regions():
+    regions = ["avon-and-somerset", "kent", "metropolitan", "surrey", "west-yorkshire"]
+    for shard_count in [1, 2, 3]:
+        shards = [[r for r in regions if region_in_shard(r, i, shard_count)] for i in range(shard_count)]
+        # every region is in exactly one shard
+        assert sorted(sum(shards, [])) == regions
+
+    assert region_selected("kent", ["kent"])
+    assert not region_selected("surrey", ["kent"])
+
+def test_month_selected():
+    assert month_selected("2023-05", "2023-01", "2023-12")
+    assert not month_selected("2022-12", "2023-01")
+    assert not month_selected("2024-01", end_month="2023-12")
+
+def test_shard_suffix():
+    assert shard_suffix((0, 1)) == ""
+    assert shard_suffix((1, 4)) == "_shard1of4"
+
+def test_help_does_not_import_the_pipeline():
+    code = "import sys, run_pipeline; print('pandas' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
+
+def test_pipeline_script_prints_config(tmp_path):
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pipeline.py")
+    result = subprocess.run([sys.executable, script, "--print-config", "--workers", "3"],
+                            cwd=tmp_path, capture_output=True, text=True, check=True)
+    assert json.loads(result.stdout)["workers"] == 3
+    # nothing was run
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,66 @@
+import pytest
+import threading
+
+from stage_runner import *
+
+def test_run_streaming_stage_processes_every_key():
+    written = {}
+
+    result = run_streaming_stage(
+        ['a', 'b', 'c'],
+        read_func=lambda key: key * 2,
+        transform_func=lambda key, data: data.upper(),
+        write_func=lambda key, data: written.__setitem__(key, data),
+    )
+
+    assert written == {'a': 'AA', 'b': 'BB', 'c': 'CC'}
+    assert sorted(result['completed']) == ['a', 'b', 'c']
+    assert result['failed'] == {}
+
+def test_run_streaming_stage_records_failures_and_continues():
+    def transform(key, data):
+        if key == 'bad':
+            raise ValueError('broken file')
+        return data
+
+    written = []
+    result = run_streaming_stage(['good', 'bad'], lambda key: key, transform,
+                                 lambda key, data: written.append(key))
+
+    assert written == ['good']
+    assert result['completed'] == ['good']
+    assert 'bad' in result['failed']
+    assert 'broken file' in result['failed']['bad']
+
+def test_run_streaming_stage_overlaps_read_and_write():
+    # The write of the first key blocks until the second key has been read,
+    # which can only finish if reading and writing run at the same time.
+    second_read = threading.Event()
+
+    def read(key):
+        if key == 2:
+            second_read.set()
+        return key
+
+    def write(key, data):
+        if key == 1:
+            assert second_read.wait(timeout=5)
+
+    result = run_streaming_stage([1, 2], read, lambda key, data: data, write,
+                                 reader_workers=1, transform_workers=1, writer_workers=1, queue_size=1)
+
+    assert sorted(result['completed']) == [1, 2]
+
+def test_run_streaming_stage_without_transform():
+    written = {}
+    threads_before = {t.name for t in threading.enumerate()}
+
+    def write(key, data):
+        # no transform threads were started
+        assert not any(t.name.startswith('transform') for t in threading.enumerate() if t.name not in threads_before)
+        written[key] = data
+
+    result = run_streaming_stage(['a', 'b', 'c'], lambda key: key * 2, None, write)
+
+    assert written == {'a': 'aa', 'b': 'bb', 'c': 'cc'}
+    assert sorted(result['completed']) == ['a', 'b', 'c']
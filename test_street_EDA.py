@@ -85,3 +85,79 @@ def test_loop_all_functions(mocker):
     loop_all_functions(regions_dict)
     
     assert pd.DataFrame.to_csv.called, "to_csv should have been called to save the results."
+
+def test_coordinate_tile_ids():
+    # London at zoom 10 is the slippy map tile x=511, y=340
+    tile_id = coordinate_tile_ids([-0.127758], [51.507351], 10)
+    x, y = tile_id_to_xy(tile_id, 10)
+    assert (x[0], y[0]) == (511, 340)
+
+    # the parent tile is the ID shifted by two bits
+    assert coordinate_tile_ids([-0.127758], [51.507351], 9)[0] == tile_id[0] >> 2
+
+def test_create_tile_crime_count_df():
+    data = {
+        "Date": ["2023-01-01", "2023-01-01", "2023-01-01", "2023-02-01"],
+        "Crime type": ["Theft", "Theft", "Theft", "Theft"],
+        "Crime ID": [1, 2, 3, 4],
+        "Longitude": ["-0.127758", "-0.127760", "-2.58791", "not a number"],
+        "Latitude": ["51.507351", "51.507350", "51.45523", "51.507351"]
+    }
+    df = pd.DataFrame(data)
+
+    result = create_tile_crime_count_df(df, zooms=(5, 16))
+
+    assert list(result.columns) == ["Zoom", "Tile ID", "Date", "Crime type", "Crime Count"]
+    # London and Bristol share a zoom 5 tile, but not a zoom 16 tile; the invalid row is dropped
+    assert result[result["Zoom"] == 5]["Crime Count"].tolist() == [3]
+    assert sorted(result[result["Zoom"] == 16]["Crime Count"].tolist()) == [1, 2]
+
+def test_write_report(tmp_path):
+    df = pd.DataFrame({"Crime type": ["Theft"], "Crime Count": [2]})
+    path = str(tmp_path / "reporting_region_df")
+
+    write_report(df, path)
+    assert pd.read_csv(path, index_col=0).equals(df)
+
+    with pytest.raises(ValueError):
+        write_report(df, path, output_format="xlsx")
+
+@pytest.fixture
+def region_df():
+    rng = np.random.default_rng(0)
+    n = 400
+    df = pd.DataFrame({
+        "Crime ID": np.where(rng.random(n) < 0.2, None, [f"id{i}" for i in range(n)]),
+        "Date": rng.choice(["2023-01", "2023-02", "2023-03", None], n, p=[0.4, 0.3, 0.29, 0.01]),
+        "Crime type": rng.choice(["Theft", "Burglary", "Drugs", "Robbery", "Arson", "Other", "Vehicle"], n),
+        "Location": rng.choice([f"On or near Street {i}" for i in range(30)] + ["No Info"], n),
+        "LSOA name": rng.choice([f"LSOA{i}" for i in range(12)], n),
+        "Longitude": rng.choice([-0.1277, -0.1278, -2.5879, np.nan], n),
+        "Latitude": rng.choice([51.5073, 51.4552, 51.5074], n),
+    })
+    return df
+
+@pytest.mark.parametrize("f", [
+    create_top_5_crime_count_year_month_df,
+    create_date_location_hotspots_df,
+    create_top_5_crime_count_location_date_df,
+    create_top_5_crime_count_LSOA_name_df,
+    create_numberic_checked_longitute_lantitude_crime_count_df,
+    create_tile_crime_count_df,
+])
+def test_numpy_engine_matches_pandas(region_df, f):
+    expected = f(region_df.copy())
+    pd.testing.assert_frame_equal(f(region_df.copy(), engine="numpy"), expected)
+    # the codes of an EncodedRegion are reused by the reports
+    pd.testing.assert_frame_equal(f(EncodedRegion(region_df.copy()), engine="numpy"), expected)
+
+def test_loop_all_functions_rejects_unknown_engine():
+    with pytest.raises(ValueError):
+        loop_all_functions({"primary_region_df": pd.DataFrame()}, engine="numba")
+
+def test_create_and_write_region_reports(region_df, tmp_path):
+    reports = create_region_reports(region_df.copy())
+    assert list(reports) == [f.__name__.split("_", 1)[1] for f in REPORT_FUNCTIONS]
+
+    write_region_reports("primary_region_df", reports, report_dir=str(tmp_path))
+    assert sorted(os.listdir(tmp_path)) == sorted(f"reporting_region_{name}" for name in reports)
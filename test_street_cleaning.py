@@ -133,3 +133,91 @@ def test_read_pipeline_csv_to_dict(mocker):
     assert "region1.csv" in result
     assert "region2.csv" in result
     assert mock_csv.call_count == 2
+
+# 8. Testing the police data file index
+def test_index_police_data_files_by_type(tmp_path):
+    (tmp_path / "2023-08").mkdir()
+    for suffix in ["street", "outcomes", "stop-and-search"]:
+        (tmp_path / "2023-08" / f"2023-08-city-of-london-{suffix}.csv").write_text("Crime ID\n1\n")
+
+    result = index_police_data_files_by_type(["street", "stop-and-search", "outcomes"], data_dir=str(tmp_path))
+    for dataset_type in ["street", "stop-and-search", "outcomes"]:
+        assert list(result[dataset_type]) == ["city-of-london"]
+        assert result[dataset_type]["city-of-london"][0].endswith(f"-{dataset_type}.csv")
+
+# 9. Testing validation
+def test_drop_rows_skips_missing_columns_only(mock_dict_with_nan):
+    # 'Crime ID' is not in the dataframes, 'Location' must still be used
+    result = drop_rows(mock_dict_with_nan, ["Crime ID", "Location"])
+    for key, value in result.items():
+        assert value.shape == (2, 3)
+
+@pytest.fixture
+def mock_validation_df():
+    return pd.DataFrame({
+        "Crime ID": ["a", None, "c", "d", "e"],
+        "Month": ["2023-08", "2023-08", "2023-13", "2023-08", "2023-08"],
+        "Latitude": [51.5, 51.5, 51.5, 10.0, 51.5],
+        "Longitude": ["-0.12", "-0.12", "-0.12", "-0.12", "not a number"]
+    })
+
+def test_validate_rows(mock_validation_df):
+    valid, report = validate_rows(mock_validation_df, required=["Crime ID", "Latitude"],
+                                  bounding_box=UK_BOUNDING_BOX, month_column="Month")
+    assert valid.tolist() == [True, False, False, False, False]
+    assert report["missing Crime ID"] == 1
+    assert report["missing Latitude"] == 0
+    assert report["Latitude outside 49.8 to 60.9"] == 1
+    assert report["Longitude outside -8.7 to 1.8"] == 1
+    assert report["Month not YYYY-MM"] == 1
+
+def test_filter_valid_rows(mock_validation_df):
+    result, report = filter_valid_rows(mock_validation_df, required=["Crime ID"], month_column="Month")
+    assert result["Crime ID"].tolist() == ["a", "d", "e"]
+    assert report["rows checked"] == 5
+    assert report["rows rejected"] == 2
+
+# 10. Testing the lazy layer
+@pytest.fixture
+def primary_layer_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("primary_dataframe")
+    for region in ["region1", "region2", "region3"]:
+        pd.DataFrame({"Crime ID": [f"{region}-{i}" for i in range(100)]}).to_csv(f"primary_dataframe/primary_{region}_df")
+    return tmp_path
+
+def test_read_pipeline_csv_to_dict_lazy(primary_layer_dir, mocker):
+    read_csv = mocker.spy(pd, "read_csv")
+
+    layer = read_pipeline_csv_to_dict("primary", lazy=True)
+    assert list(layer) == ["primary_region1_df", "primary_region2_df", "primary_region3_df"]
+    assert read_csv.call_count == 0
+
+    os.chdir("..")  # the layer keeps working after the directory changes
+    assert layer["primary_region2_df"]["Crime ID"].iloc[0] == "region2-0"
+    assert read_csv.call_count == 1
+    with pytest.raises(KeyError):
+        layer["primary_region4_df"]
+
+def test_lazy_layer_lru_cache(primary_layer_dir, mocker):
+    region_bytes = int(pd.read_csv("primary_dataframe/primary_region1_df", index_col=0).memory_usage(deep=True).sum())
+    read_csv = mocker.spy(pd, "read_csv")
+
+    layer = LazyLayer("primary", cache_bytes=2 * region_bytes)
+    layer["primary_region1_df"]
+    layer["primary_region2_df"]
+    layer["primary_region1_df"]  # cached
+    assert read_csv.call_count == 2
+
+    layer["primary_region3_df"]  # evicts region2, the least recently used
+    layer["primary_region1_df"]
+    assert read_csv.call_count == 3
+    layer["primary_region2_df"]
+    assert read_csv.call_count == 4
+
+def test_lazy_layer_without_cache_reads_every_time(primary_layer_dir, mocker):
+    read_csv = mocker.spy(pd, "read_csv")
+    layer = LazyLayer("primary")
+    layer["primary_region1_df"]
+    layer["primary_region1_df"]
+    assert read_csv.call_count == 2